@@ -0,0 +1,293 @@
+import asyncio
+import json
+import uuid
+import weakref
+
+import httpx
+
+from asgiref.sync import sync_to_async
+from django.http import HttpRequest, HttpResponse, HttpResponseNotAllowed
+from rest_framework import status
+
+from . import views
+from .breaker import BREAKERS, CircuitOpenError
+from .bulkhead import AsyncBulkhead, BulkheadFull
+from .deadline import DeadlineExceeded, deadline_headers, remaining
+from .pool import POOL_SIZE, POOL_CONNECT_TIMEOUT, POOL_READ_TIMEOUT, POOL_MAX_IDLE
+from .retry import with_retries_async
+from .singleflight import params_key
+from .stale import async_stale_while_revalidate, carry_staleness
+from .conditional import conditional_response
+from .views import (
+    ServiceUrl, REPRESENTATION_CACHE, SINGLE_FLIGHT, STALE_CACHE, USER_CACHE,
+    make_response, record_view, replace_users,
+)
+
+
+RETRY_ERRORS = (httpx.NetworkError, httpx.ConnectTimeout, httpx.RemoteProtocolError)
+UPSTREAM_ERRORS = (httpx.HTTPError, CircuitOpenError, DeadlineExceeded, BulkheadFull)
+
+
+class AsyncServicePool:
+    def __init__(self, name: str, url: str):
+        self.name = name
+        self.url = url
+        self.clients = weakref.WeakKeyDictionary()
+        self.bulkhead = AsyncBulkhead(name)
+
+    # httpx clients are bound to the event loop they were first used on
+    def client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if (client := self.clients.get(loop)) is None:
+            client = self.clients[loop] = httpx.AsyncClient(
+                base_url=self.url,
+                limits=httpx.Limits(
+                    max_connections=POOL_SIZE,
+                    max_keepalive_connections=POOL_SIZE,
+                    keepalive_expiry=POOL_MAX_IDLE,
+                ),
+                timeout=httpx.Timeout(POOL_READ_TIMEOUT, connect=POOL_CONNECT_TIMEOUT),
+            )
+        return client
+
+    async def request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        if (left := remaining()) is not None:
+            kwargs['timeout'] = httpx.Timeout(min(POOL_READ_TIMEOUT, left), connect=min(POOL_CONNECT_TIMEOUT, left))
+            kwargs['headers'] = deadline_headers(kwargs.get('headers'))
+        return await self.client().request(method, path, **kwargs)
+
+
+SESSION_POOL = AsyncServicePool('session', ServiceUrl.SESSION)
+PUBLICATION_POOL = AsyncServicePool('publication', ServiceUrl.PUBLICATION)
+SUBSCRIPTION_POOL = AsyncServicePool('subscription', ServiceUrl.SUBSCRIPTION)
+STATISTICS_POOL = AsyncServicePool('statistics', ServiceUrl.STATISTICS)
+
+
+# The async calls share the circuit breakers of their sync counterparts, so both modes agree on service health.
+async def req(pool: AsyncServicePool, sync_request, method: str, path: str, **kwargs) -> httpx.Response:
+    async with pool.bulkhead:
+        async with BREAKERS[sync_request.__name__].guard_async():
+            if method == 'GET' and kwargs.keys() <= {'params'}:
+                key = (pool.name, path, params_key(kwargs.get('params')))
+                res = await SINGLE_FLIGHT.do_async(key, with_retries_async, pool, RETRY_ERRORS, method, path, **kwargs)
+            else:
+                res = await with_retries_async(pool, RETRY_ERRORS, method, path, **kwargs)
+            if res.status_code >= status.HTTP_500_INTERNAL_SERVER_ERROR:
+                res.raise_for_status()
+    return res
+
+
+@async_stale_while_revalidate(STALE_CACHE, views.session_request)
+async def session_request(method: str, path: str, **kwargs) -> httpx.Response:
+    return await req(SESSION_POOL, views.session_request, method, path, **kwargs)
+
+
+@async_stale_while_revalidate(STALE_CACHE, views.publication_request)
+async def publication_request(method: str, path: str, **kwargs) -> httpx.Response:
+    return await req(PUBLICATION_POOL, views.publication_request, method, path, **kwargs)
+
+
+@async_stale_while_revalidate(STALE_CACHE, views.subscription_request)
+async def subscription_request(method: str, path: str, **kwargs) -> httpx.Response:
+    return await req(SUBSCRIPTION_POOL, views.subscription_request, method, path, **kwargs)
+
+
+@async_stale_while_revalidate(STALE_CACHE, views.statistics_request)
+async def statistics_request(method: str, path: str, **kwargs) -> httpx.Response:
+    return await req(STATISTICS_POOL, views.statistics_request, method, path, **kwargs)
+
+
+# httpx timeouts get the same 504 as the sync mode's requests.Timeout
+def unavailable(service_name, error) -> HttpResponse:
+    if isinstance(error, httpx.TimeoutException):
+        error = DeadlineExceeded(str(error))
+    return views.unavailable(service_name, error)
+
+
+def query_params(request: HttpRequest) -> list[tuple[str, str]]:
+    return [(key, value) for key, values in request.GET.lists() for value in values]
+
+
+async def gather(*aws) -> list:
+    return await asyncio.gather(*aws, return_exceptions=True)
+
+
+def check(res: httpx.Response | BaseException, service_name: str) -> HttpResponse | None:
+    if isinstance(res, UPSTREAM_ERRORS):
+        return unavailable(service_name, res)
+    if isinstance(res, BaseException):
+        raise res
+    if res.status_code != status.HTTP_200_OK:
+        return make_response(res)
+
+
+async def circuit_redirect(request: HttpRequest, service_name: str, circuit_request, path: str) -> HttpResponse:
+    headers = {}
+    if content_type := request.headers.get('content-type'):
+        headers['content-type'] = content_type
+    if request.method == 'GET' and (if_none_match := request.headers.get('if-none-match')):
+        headers['if-none-match'] = if_none_match
+    try:
+        res = await circuit_request(request.method, path, params=query_params(request), content=request.body,
+                                    headers=headers)
+    except UPSTREAM_ERRORS as e:
+        return unavailable(service_name, e)
+    return make_response(res)
+
+
+def circuit_api_view_redirect(http_method_names: list[str], service_name, circuit_request, path):
+    async def try_except_circuit_redirect(request: HttpRequest) -> HttpResponse:
+        if request.method not in http_method_names:
+            return HttpResponseNotAllowed(http_method_names)
+        return await circuit_redirect(request, service_name, circuit_request, path)
+
+    try_except_circuit_redirect.csrf_exempt = True
+    return try_except_circuit_redirect
+
+
+# Django would run a plain sync view on its single shared thread; this runs it on a thread of its own
+def sync_fallback(view):
+    async_view = sync_to_async(view, thread_sensitive=False)
+    async_view.csrf_exempt = getattr(view, 'csrf_exempt', False)
+    return async_view
+
+
+async def fetch_users(uids) -> dict | HttpResponse:
+    users = USER_CACHE.get_many(uids)
+    missing = set(uids) - users.keys()
+    if not missing:
+        return users
+
+    try:
+        res = await session_request('POST', '/api/v1/users/bulk/', json={'ids': list(missing)})
+    except UPSTREAM_ERRORS as e:
+        if len(stale := USER_CACHE.get_many(missing, stale=True)) == len(missing):
+            return users | stale
+        return unavailable('Session', e)
+    if res.status_code != status.HTTP_200_OK:
+        return make_response(res)
+
+    fetched = res.json()
+    USER_CACHE.set_many(fetched)
+    return users | fetched
+
+
+# Session Service
+
+users = circuit_api_view_redirect(['GET', 'POST'], 'Session', session_request, '/api/v1/users/')
+users_bulk = circuit_api_view_redirect(['POST'], 'Session', session_request, '/api/v1/users/bulk/')
+user_by_token = circuit_api_view_redirect(['POST'], 'Session', session_request, '/api/v1/user-by-token/')
+
+
+# Subscription Service
+
+subscriptions = circuit_api_view_redirect(['GET', 'POST'], 'Subscription', subscription_request,
+                                          '/api/v1/subscriptions/')
+
+
+# Publication Service
+
+tags = circuit_api_view_redirect(['GET'], 'Publication', publication_request, '/api/v1/tags/')
+votes = circuit_api_view_redirect(['GET'], 'Publication', publication_request, '/api/v1/votes/')
+vote = circuit_api_view_redirect(['POST'], 'Publication', publication_request, '/api/v1/vote/')
+comments = circuit_api_view_redirect(['GET', 'POST'], 'Publication', publication_request, '/api/v1/comments/')
+
+sync_publications = sync_fallback(views.Publications.as_view())
+sync_publication = sync_fallback(views.Publication.as_view())
+
+
+# Unlike the sync view, this one buffers large pages (and make_response buffers pass-throughs): Django 4.0's ASGI
+# handler iterates a StreamingHttpResponse synchronously on the event loop, so relaying the upstream chunk by chunk
+# would block every other request while each chunk is read. The stream-through memory bound holds in WSGI mode only.
+async def publications(request: HttpRequest) -> HttpResponse:
+    if request.method != 'GET':
+        return await sync_publications(request)
+
+    try:
+        res = await publication_request('GET', '/api/v1/publications/', params=query_params(request))
+    except UPSTREAM_ERRORS as e:
+        return unavailable('Publication', e)
+    if res.status_code != status.HTTP_200_OK:
+        return make_response(res)
+
+    fingerprint = REPRESENTATION_CACHE.fingerprint(res)
+    if (representation := REPRESENTATION_CACHE.get(fingerprint)) is None:
+        data = res.json()
+        users = await fetch_users({item['author_uid'] for item in data['items']})
+        if isinstance(users, HttpResponse):
+            return users
+        err = replace_users(data['items'], 'author_uid', 'author', users=users)
+        if err is not None:
+            return err
+        representation = REPRESENTATION_CACHE.put(fingerprint, json.dumps(data).encode())
+
+    return carry_staleness(conditional_response(request, *representation), res)
+
+
+async def publication(request: HttpRequest, uid: uuid.UUID) -> HttpResponse:
+    if request.method != 'GET':
+        return await sync_publication(request, uid=uid)
+
+    params = query_params(request)
+    publication_res, comments_res = await gather(
+        publication_request('GET', f'/api/v1/publications/{uid}/', params=params),
+        publication_request('GET', f'/api/v1/comments/?publication={uid}', params=params),
+    )
+    if (err := check(publication_res, 'Publication')) is not None:
+        return err
+    if (err := check(comments_res, 'Publication')) is not None:
+        return err
+
+    fingerprint = REPRESENTATION_CACHE.fingerprint(publication_res, comments_res)
+    if (representation := REPRESENTATION_CACHE.get(fingerprint)) is None:
+        data = {'publication': publication_res.json()}
+        data.update(comments_res.json())
+        items = [data['publication'], *data.get('items', [])]
+        users = await fetch_users({item['author_uid'] for item in items})
+        if isinstance(users, HttpResponse):
+            return users
+        err = replace_users(items, 'author_uid', 'author', users=users)
+        if err is not None:
+            return err
+        representation = REPRESENTATION_CACHE.put(fingerprint, json.dumps(data).encode())
+
+    record_view(str(uid), request.GET.get('viewer_uid'))
+
+    return carry_staleness(conditional_response(request, *representation), publication_res, comments_res)
+
+
+publications.csrf_exempt = True
+publication.csrf_exempt = True
+
+
+# Statistics Service
+
+async def statistics(request: HttpRequest, uid: uuid.UUID) -> HttpResponse:
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+
+    publication_res, statistics_res = await gather(
+        publication_request('GET', f'/api/v1/publications/{uid}/'),
+        statistics_request('GET', f'/api/v1/statistics/?publication_uid={uid}', params=query_params(request)),
+    )
+    if (err := check(publication_res, 'Publication')) is not None:
+        return err
+    if (err := check(statistics_res, 'Statistics')) is not None:
+        return err
+    data = {'publication': publication_res.json()}
+    data.update(statistics_res.json())
+
+    uids = {item['viewer_uid'] for item in data['items'] if item['viewer_uid']}
+    users = await fetch_users(uids | {data['publication']['author_uid']})
+    if isinstance(users, HttpResponse):
+        return users
+
+    err = replace_users([data['publication']], 'author_uid', 'author', users=users)
+    if err is not None:
+        return err
+    err = replace_users(data['items'], 'viewer_uid', 'viewer', '%%guest%%', users=users)
+    if err is not None:
+        return err
+
+    response = HttpResponse(content=json.dumps(data), content_type='application/json')
+    return carry_staleness(response, publication_res, statistics_res)
@@ -0,0 +1,296 @@
+import math
+import os
+import sqlite3
+import threading
+import time
+
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import asynccontextmanager, contextmanager
+from functools import wraps
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+
+from .deadline import DeadlineExceeded
+
+
+BREAKER_PATH = os.getenv('BLOG_GATEWAY_BREAKER_PATH', str(Path(__file__).resolve().parent.parent / 'breaker.sqlite3'))
+BREAKER_WINDOW = int(os.getenv('BLOG_GATEWAY_BREAKER_WINDOW', '10'))
+BREAKER_MIN_CALLS = int(os.getenv('BLOG_GATEWAY_BREAKER_MIN_CALLS', '5'))
+BREAKER_ERROR_RATE = float(os.getenv('BLOG_GATEWAY_BREAKER_ERROR_RATE', '0.5'))
+BREAKER_LATENCY_MIN_CALLS = int(os.getenv('BLOG_GATEWAY_BREAKER_LATENCY_MIN_CALLS', '50'))
+BREAKER_P99_LATENCY = float(os.getenv('BLOG_GATEWAY_BREAKER_P99_LATENCY', '5'))
+BREAKER_RECOVERY_TIMEOUT = float(os.getenv('BLOG_GATEWAY_BREAKER_RECOVERY_TIMEOUT', '30'))
+BREAKER_PROBES = int(os.getenv('BLOG_GATEWAY_BREAKER_PROBES', '3'))
+BREAKER_SYNC_INTERVAL = float(os.getenv('BLOG_GATEWAY_BREAKER_SYNC_INTERVAL', '1'))
+
+# upper bounds in seconds; a latency above the last one lands in an extra overflow bucket
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+BREAKERS = {}
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, breaker: 'Breaker'):
+        super().__init__(breaker.name)
+        self.breaker = breaker
+
+    def __str__(self):
+        until = time.ctime(self.breaker.opened_at + BREAKER_RECOVERY_TIMEOUT)
+        return f'Circuit "{self.breaker.name}" OPEN until {until}'
+
+
+# Breaker state and call samples live in one SQLite file, so every gateway worker process sees the same breakers.
+class BreakerStore:
+    def __init__(self, path: str):
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('''
+            CREATE TABLE IF NOT EXISTS breaker (
+                name TEXT PRIMARY KEY,
+                state TEXT NOT NULL DEFAULT 'closed',
+                opened_at REAL NOT NULL DEFAULT 0,
+                probes INTEGER NOT NULL DEFAULT 0,
+                successes INTEGER NOT NULL DEFAULT 0,
+                probe_until REAL NOT NULL DEFAULT 0
+            )
+        ''')
+        self.connection.execute('''
+            CREATE TABLE IF NOT EXISTS breaker_sample (
+                name TEXT NOT NULL,
+                second INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                calls INTEGER NOT NULL,
+                failures INTEGER NOT NULL,
+                PRIMARY KEY (name, second, bucket)
+            )
+        ''')
+
+    def register(self, name: str):
+        with self.lock:
+            self.connection.execute('INSERT OR IGNORE INTO breaker (name) VALUES (?)', (name,))
+
+    def state(self, name: str) -> tuple[str, float]:
+        with self.lock:
+            return self.connection.execute('SELECT state, opened_at FROM breaker WHERE name = ?', (name,)).fetchone()
+
+    def flush(self, name: str, samples: dict, since: int) -> list[tuple[int, int, int]]:
+        with self.lock:
+            self.connection.executemany(
+                'INSERT INTO breaker_sample VALUES (?, ?, ?, ?, ?) ON CONFLICT (name, second, bucket) '
+                'DO UPDATE SET calls = calls + excluded.calls, failures = failures + excluded.failures',
+                [(name, second, bucket, calls, failures) for (second, bucket), (calls, failures) in samples.items()],
+            )
+            self.connection.execute('DELETE FROM breaker_sample WHERE second <= ?', (since,))
+            return self.connection.execute(
+                'SELECT bucket, SUM(calls), SUM(failures) FROM breaker_sample '
+                'WHERE name = ? AND second > ? GROUP BY bucket ORDER BY bucket',
+                (name, since),
+            ).fetchall()
+
+    def trip(self, name: str, now: float):
+        with self.lock:
+            self.connection.execute(
+                "UPDATE breaker SET state = 'open', opened_at = ?, probes = 0, successes = 0 "
+                "WHERE name = ? AND state = 'closed'",
+                (now, name),
+            )
+
+    # Probe slots are claimed atomically across processes. A round of probes that never reported back
+    # (e.g. its worker died) expires after the recovery timeout and a new round starts.
+    def claim_probe(self, name: str, now: float) -> bool:
+        with self.lock:
+            return self.connection.execute(
+                "UPDATE breaker SET state = 'half_open', "
+                "probes = CASE WHEN state = 'open' OR probe_until <= :now THEN 1 ELSE probes + 1 END, "
+                "successes = CASE WHEN state = 'open' OR probe_until <= :now THEN 0 ELSE successes END, "
+                "probe_until = CASE WHEN state = 'open' OR probe_until <= :now THEN :now + :recovery "
+                "ELSE probe_until END "
+                "WHERE name = :name AND ("
+                "(state = 'open' AND opened_at + :recovery <= :now) OR "
+                "(state = 'half_open' AND (probes < :probes OR probe_until <= :now)))",
+                {'name': name, 'now': now, 'recovery': BREAKER_RECOVERY_TIMEOUT, 'probes': BREAKER_PROBES},
+            ).rowcount == 1
+
+    def probe_succeeded(self, name: str):
+        with self.lock:
+            self.connection.execute(
+                "UPDATE breaker SET successes = successes + 1 WHERE name = ? AND state = 'half_open'", (name,))
+            closed = self.connection.execute(
+                "UPDATE breaker SET state = 'closed', probes = 0, successes = 0 "
+                "WHERE name = ? AND state = 'half_open' AND successes >= ?",
+                (name, BREAKER_PROBES),
+            ).rowcount
+            if closed:
+                self.connection.execute('DELETE FROM breaker_sample WHERE name = ?', (name,))
+
+    def probe_failed(self, name: str, now: float):
+        with self.lock:
+            self.connection.execute(
+                "UPDATE breaker SET state = 'open', opened_at = ?, probes = 0, successes = 0 "
+                "WHERE name = ? AND state = 'half_open'",
+                (now, name),
+            )
+
+
+STORE = BreakerStore(BREAKER_PATH)
+
+
+def percentile(rows: list[tuple[int, int, int]], calls: int, q: float) -> float | None:
+    if not calls:
+        return None
+    target = math.ceil(q * calls)
+    seen = 0
+    for bucket, bucket_calls, _ in rows:
+        seen += bucket_calls
+        if seen >= target:
+            return LATENCY_BUCKETS[min(bucket, len(LATENCY_BUCKETS) - 1)]
+
+
+def is_failure(error: BaseException) -> bool:
+    # a spent deadline is raised before the service is contacted, so it says nothing about the service
+    return isinstance(error, Exception) and not isinstance(error, DeadlineExceeded)
+
+
+class Breaker:
+    def __init__(self, name: str, store: BreakerStore = STORE):
+        self.name = name
+        self.store = store
+        self.lock = threading.Lock()
+        self.pending = defaultdict(lambda: [0, 0])
+        self.pending_failures = 0
+        self.synced_at = 0
+        self.state = CLOSED
+        self.opened_at = 0
+        self.calls = 0
+        self.failures = 0
+        self.p99 = None
+        store.register(name)
+        BREAKERS[name] = self
+
+    def needs_sync(self) -> bool:
+        return time.time() - self.synced_at >= BREAKER_SYNC_INTERVAL or self.pending_failures >= BREAKER_MIN_CALLS
+
+    # Calls are counted locally and merged into the shared window about once per sync interval,
+    # or right away once enough failures piled up to trip the breaker on their own.
+    def sync(self, force: bool = False):
+        now = time.time()
+        with self.lock:
+            if not force and not self.needs_sync():
+                return
+            pending, self.pending = self.pending, defaultdict(lambda: [0, 0])
+            self.pending_failures = 0
+            self.synced_at = now
+
+        rows = self.store.flush(self.name, pending, int(now) - BREAKER_WINDOW)
+        self.calls = sum(row[1] for row in rows)
+        self.failures = sum(row[2] for row in rows)
+        self.p99 = percentile(rows, self.calls, 0.99)
+        state, _ = self.store.state(self.name)
+        if state == CLOSED and (
+                self.calls >= BREAKER_MIN_CALLS and self.failures >= BREAKER_ERROR_RATE * self.calls or
+                self.calls >= BREAKER_LATENCY_MIN_CALLS and self.p99 > BREAKER_P99_LATENCY):
+            print(f'{self.name}: circuit opened ({self.failures}/{self.calls} failed, p99 {self.p99}s)')
+            self.store.trip(self.name, now)
+        self.state, self.opened_at = self.store.state(self.name)
+
+    def record(self, started: float, failed: bool):
+        bucket = bisect_left(LATENCY_BUCKETS, time.monotonic() - started)
+        with self.lock:
+            sample = self.pending[(int(time.time()), bucket)]
+            sample[0] += 1
+            sample[1] += failed
+            self.pending_failures += failed
+
+    @property
+    def opened(self) -> bool:
+        self.sync()
+        return self.state == OPEN and time.time() < self.opened_at + BREAKER_RECOVERY_TIMEOUT
+
+    @contextmanager
+    def guard(self):
+        self.sync()
+        probe = self.state != CLOSED
+        if probe and not self.store.claim_probe(self.name, time.time()):
+            raise CircuitOpenError(self)
+
+        started = time.monotonic()
+        try:
+            yield
+        except BaseException as e:
+            if not is_failure(e):
+                raise
+            if probe:
+                self.store.probe_failed(self.name, time.time())
+            else:
+                self.record(started, True)
+            raise
+        else:
+            if probe:
+                self.store.probe_succeeded(self.name)
+            else:
+                self.record(started, False)
+        finally:
+            if probe:
+                self.sync(force=True)
+
+    # The store may wait on other processes for up to its lock timeout,
+    # so the async variants run its calls in worker threads instead of on the event loop.
+    async def opened_async(self) -> bool:
+        if self.needs_sync():
+            await sync_to_async(self.sync, thread_sensitive=False)()
+        return self.state == OPEN and time.time() < self.opened_at + BREAKER_RECOVERY_TIMEOUT
+
+    @asynccontextmanager
+    async def guard_async(self):
+        if self.needs_sync():
+            await sync_to_async(self.sync, thread_sensitive=False)()
+        probe = self.state != CLOSED
+        if probe and not await sync_to_async(self.store.claim_probe, thread_sensitive=False)(self.name, time.time()):
+            raise CircuitOpenError(self)
+
+        started = time.monotonic()
+        try:
+            yield
+        except BaseException as e:
+            if not is_failure(e):
+                raise
+            if probe:
+                await sync_to_async(self.store.probe_failed, thread_sensitive=False)(self.name, time.time())
+            else:
+                self.record(started, True)
+            raise
+        else:
+            if probe:
+                await sync_to_async(self.store.probe_succeeded, thread_sensitive=False)(self.name)
+            else:
+                self.record(started, False)
+        finally:
+            if probe:
+                await sync_to_async(self.sync, thread_sensitive=False)(force=True)
+
+    def stats(self) -> dict:
+        return {
+            'state': self.state,
+            'opened_at': self.opened_at or None,
+            'calls': self.calls,
+            'failures': self.failures,
+            'p99': self.p99,
+        }
+
+
+def circuit(func):
+    breaker = Breaker(func.__name__)
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with breaker.guard():
+            return func(*args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,31 @@
+import threading
+import time
+
+
+class BatchBuffer:
+    def __init__(self, flush, max_size: int, interval: float):
+        self.flush_callback = flush
+        self.max_size = max_size
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.items = []
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def add(self, item):
+        with self.lock:
+            self.items.append(item)
+            if len(self.items) < self.max_size:
+                return
+            batch, self.items = self.items, []
+        self.flush_callback(batch)
+
+    def flush(self):
+        with self.lock:
+            batch, self.items = self.items, []
+        if batch:
+            self.flush_callback(batch)
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
@@ -0,0 +1,142 @@
+import asyncio
+import os
+import threading
+
+import requests
+
+from collections import deque
+from functools import wraps
+
+from .deadline import remaining
+
+
+BULKHEADS = []
+
+
+class BulkheadFull(requests.RequestException):
+    pass
+
+
+def setting(name: str, option: str, default: str) -> str:
+    return os.getenv(f'BLOG_GATEWAY_{name.upper()}_{option}', os.getenv(f'BLOG_GATEWAY_BULKHEAD_{option}', default))
+
+
+class BaseBulkhead:
+    def __init__(self, name: str):
+        self.name = name
+        self.limit = int(setting(name, 'CONCURRENCY', '32'))
+        self.queue_size = int(setting(name, 'QUEUE', '64'))
+        self.queue_timeout = float(setting(name, 'QUEUE_TIMEOUT', '1'))
+        self.in_flight = 0
+        self.rejected = 0
+        self.timed_out = 0
+        BULKHEADS.append(self)
+
+    # a queued call never waits past the request deadline
+    def wait_timeout(self) -> float:
+        left = remaining()
+        return self.queue_timeout if left is None else min(self.queue_timeout, left)
+
+    def queued(self) -> int:
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {
+            'in_flight': self.in_flight,
+            'queued': self.queued(),
+            'limit': self.limit,
+            'queue_size': self.queue_size,
+            'rejected': self.rejected,
+            'timed_out': self.timed_out,
+        }
+
+
+class Bulkhead(BaseBulkhead):
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.condition = threading.Condition()
+        self.waiting = 0
+
+    def acquire(self):
+        with self.condition:
+            if self.in_flight < self.limit and not self.waiting:
+                self.in_flight += 1
+                return
+            if self.waiting >= self.queue_size:
+                self.rejected += 1
+                raise BulkheadFull(f'{self.name} bulkhead is full')
+            self.waiting += 1
+            try:
+                acquired = self.condition.wait_for(lambda: self.in_flight < self.limit, self.wait_timeout())
+            finally:
+                self.waiting -= 1
+            if not acquired:
+                self.timed_out += 1
+                raise BulkheadFull(f'{self.name} bulkhead queue timed out')
+            self.in_flight += 1
+
+    def release(self):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify()
+
+    def queued(self) -> int:
+        return self.waiting
+
+
+class AsyncBulkhead(BaseBulkhead):
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.name = f'{name} (async)'
+        self.waiters = deque()
+
+    async def acquire(self):
+        if self.in_flight < self.limit and not self.waiters:
+            self.in_flight += 1
+            return
+        if len(self.waiters) >= self.queue_size:
+            self.rejected += 1
+            raise BulkheadFull(f'{self.name} bulkhead is full')
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.wait_timeout())
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise BulkheadFull(f'{self.name} bulkhead queue timed out')
+        finally:
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+
+    # the slot is handed straight to the oldest waiter, so in_flight only drops when nobody is queued
+    def release(self):
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    async def __aenter__(self):
+        await self.acquire()
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+    def queued(self) -> int:
+        return len(self.waiters)
+
+
+def bulkhead(limiter: Bulkhead):
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            limiter.acquire()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                limiter.release()
+
+        return wrapper
+
+    return decorator
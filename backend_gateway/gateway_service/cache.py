@@ -0,0 +1,75 @@
+import threading
+import time
+
+from collections import OrderedDict
+
+
+# Expired entries are kept for another `max_stale` seconds, where only get_many(..., stale=True) sees them.
+class TTLCache:
+    def __init__(self, maxsize: int, ttl: float, max_stale: float = 0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.lock = threading.Lock()
+        self.items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _get(self, key, now: float, max_stale: float = 0):
+        if key not in self.items:
+            self.misses += 1
+            return None
+        expires_at, value = self.items[key]
+        if expires_at + max_stale <= now:
+            if expires_at + self.max_stale <= now:
+                del self.items[key]
+                self.expirations += 1
+            self.misses += 1
+            return None
+        self.items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def _set(self, key, value, now: float):
+        if self.maxsize <= 0:
+            return
+        self.items[key] = (now + self.ttl, value)
+        self.items.move_to_end(key)
+        while len(self.items) > self.maxsize:
+            self.items.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key, default=None):
+        with self.lock:
+            value = self._get(key, time.monotonic())
+        return default if value is None else value
+
+    def get_many(self, keys, stale: bool = False) -> dict:
+        now = time.monotonic()
+        max_stale = self.max_stale if stale else 0
+        with self.lock:
+            found = {key: self._get(key, now, max_stale) for key in keys}
+        return {key: value for key, value in found.items() if value is not None}
+
+    def set(self, key, value):
+        with self.lock:
+            self._set(key, value, time.monotonic())
+
+    def set_many(self, mapping: dict):
+        now = time.monotonic()
+        with self.lock:
+            for key, value in mapping.items():
+                self._set(key, value, now)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                'size': len(self.items),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
@@ -0,0 +1,32 @@
+import hashlib
+
+from django.http import HttpRequest, HttpResponse
+from django.utils.cache import get_conditional_response
+
+from .cache import TTLCache
+
+
+class RepresentationCache(TTLCache):
+    # Assembled bodies are keyed by the upstream bytes they were built from,
+    # so an unchanged upstream answer reuses the body and its ETag without re-encoding.
+    @staticmethod
+    def fingerprint(*responses) -> str:
+        digest = hashlib.sha256()
+        for res in responses:
+            digest.update(hashlib.sha256(res.content).digest())
+        return digest.hexdigest()
+
+    def put(self, fingerprint: str, content: bytes) -> tuple[str, bytes]:
+        representation = (make_etag(content), content)
+        self.set(fingerprint, representation)
+        return representation
+
+
+def make_etag(content: bytes) -> str:
+    return f'"{hashlib.sha256(content).hexdigest()}"'
+
+
+def conditional_response(request: HttpRequest, etag: str, content: bytes) -> HttpResponse:
+    response = HttpResponse(content=content, content_type='application/json')
+    response['ETag'] = etag
+    return get_conditional_response(request, etag=etag, response=response)
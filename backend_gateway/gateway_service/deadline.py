@@ -0,0 +1,54 @@
+import asyncio
+import contextvars
+import os
+import time
+
+import requests
+
+from functools import wraps
+
+
+DEADLINE_HEADER = 'X-Request-Deadline'
+DEFAULT_BUDGET = float(os.getenv('BLOG_GATEWAY_DEADLINE', '10'))
+
+DEADLINE = contextvars.ContextVar('deadline', default=None)
+
+
+class DeadlineExceeded(requests.Timeout):
+    pass
+
+
+# The deadline is an absolute unix time, so the services can tell how long a request waited in their queue.
+def with_deadline(view, budget: float = DEFAULT_BUDGET):
+    if asyncio.iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(*args, **kwargs):
+            token = DEADLINE.set(time.time() + budget)
+            try:
+                return await view(*args, **kwargs)
+            finally:
+                DEADLINE.reset(token)
+
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = DEADLINE.set(time.time() + budget)
+        try:
+            return view(*args, **kwargs)
+        finally:
+            DEADLINE.reset(token)
+
+    return wrapper
+
+
+def remaining() -> float | None:
+    if (deadline := DEADLINE.get()) is None:
+        return None
+    if (left := deadline - time.time()) <= 0:
+        raise DeadlineExceeded('request deadline exceeded')
+    return left
+
+
+def deadline_headers(headers: dict | None) -> dict:
+    return {**(headers or {}), DEADLINE_HEADER: f'{DEADLINE.get():.3f}'}
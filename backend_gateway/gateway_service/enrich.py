@@ -0,0 +1,177 @@
+import codecs
+import json
+
+from django.http import HttpResponse
+
+
+DECODER = json.JSONDecoder()
+WHITESPACE = ' \t\n\r'
+# characters that can continue a number raw_decode already accepted, e.g. the "." of a "1." cut at a chunk end
+NUMBER_TAIL = '.eE'
+NEED_MORE = object()
+
+START, KEY, COLON, VALUE, AFTER_VALUE, FIRST_ITEM, ITEM, AFTER_ITEM, END = range(9)
+
+
+class EnrichmentError(Exception):
+    def __init__(self, response: HttpResponse):
+        super().__init__(response.status_code)
+        self.response = response
+
+
+# Splits a page object ({"items_count": ..., "items": [...]}) into events while its text arrives in pieces,
+# so only the item being decoded has to be held in memory.
+class PageParser:
+    def __init__(self, list_key: str = 'items'):
+        self.list_key = list_key
+        self.buffer = ''
+        self.pos = 0
+        self.state = START
+        self.key = None
+
+    def skip_whitespace(self):
+        while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+            self.pos += 1
+
+    def expect(self, char: str):
+        if self.buffer[self.pos] != char:
+            raise ValueError(f'unexpected {self.buffer[self.pos]!r} in JSON page, expected {char!r}')
+        self.pos += 1
+
+    # A value that ends exactly at the end of the buffer, or a number followed by what could continue it,
+    # may be cut short, so it waits for more text.
+    def decode(self, final: bool):
+        try:
+            value, end = DECODER.raw_decode(self.buffer, self.pos)
+        except json.JSONDecodeError:
+            if final:
+                raise
+            return NEED_MORE
+        number = isinstance(value, (int, float)) and not isinstance(value, bool)
+        if not final and (end == len(self.buffer) or number and self.buffer[end] in NUMBER_TAIL):
+            return NEED_MORE
+        self.pos = end
+        return value
+
+    def feed(self, text: str, final: bool = False):
+        self.buffer = self.buffer[self.pos:] + text
+        self.pos = 0
+        while self.state != END:
+            self.skip_whitespace()
+            if self.pos >= len(self.buffer):
+                break
+            char = self.buffer[self.pos]
+
+            if self.state == START:
+                self.expect('{')
+                self.state = KEY
+                yield 'start', None
+            elif self.state == KEY:
+                if char == '}':
+                    self.pos += 1
+                    self.state = END
+                    yield 'end', None
+                    continue
+                if (key := self.decode(final)) is NEED_MORE:
+                    break
+                self.key = key
+                self.state = COLON
+            elif self.state == COLON:
+                self.expect(':')
+                self.state = VALUE
+            elif self.state == VALUE:
+                if self.key == self.list_key:
+                    self.expect('[')
+                    self.state = FIRST_ITEM
+                    yield 'items_start', self.key
+                    continue
+                if (value := self.decode(final)) is NEED_MORE:
+                    break
+                self.state = AFTER_VALUE
+                yield 'field', (self.key, value)
+            elif self.state == AFTER_VALUE:
+                if char == ',':
+                    self.pos += 1
+                    self.state = KEY
+                    continue
+                self.expect('}')
+                self.state = END
+                yield 'end', None
+            elif self.state in (FIRST_ITEM, ITEM):
+                if self.state == FIRST_ITEM and char == ']':
+                    self.pos += 1
+                    self.state = AFTER_VALUE
+                    yield 'items_end', None
+                    continue
+                if (item := self.decode(final)) is NEED_MORE:
+                    break
+                self.state = AFTER_ITEM
+                yield 'item', item
+            elif self.state == AFTER_ITEM:
+                if char == ',':
+                    self.pos += 1
+                    self.state = ITEM
+                    continue
+                self.expect(']')
+                self.state = AFTER_VALUE
+                yield 'items_end', None
+
+        if final and self.state != END:
+            raise ValueError('truncated JSON page')
+
+
+# Rewrites a streamed page batch by batch: `enrich` mutates each batch of items in place
+# and raises EnrichmentError to abort. Output matches json.dumps of the whole page.
+# Nothing is yielded before the first batch is enriched (or the page turns out to have no items),
+# so a failing enrichment can still be answered with an error instead of a cut-off page.
+def enrich_page(chunks, enrich, batch_size: int):
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    parser = PageParser()
+    batch = []
+    fields = 0
+    items = 0
+    ready = False
+
+    def flush() -> str:
+        nonlocal items, ready
+        enrich(batch)
+        ready = True
+        text = ('' if not items else ', ') + ', '.join(json.dumps(item) for item in batch)
+        items += len(batch)
+        batch.clear()
+        return text
+
+    def rewrite(text: str, final: bool = False) -> list[str]:
+        nonlocal fields, ready
+        out = []
+        for event, value in parser.feed(text, final):
+            if event == 'start':
+                out.append('{')
+            elif event in ('field', 'items_start'):
+                key = value[0] if event == 'field' else value
+                out.append(', ' if fields else '')
+                out.append(json.dumps(key) + ': ')
+                out.append(json.dumps(value[1]) if event == 'field' else '[')
+                fields += 1
+            elif event == 'item':
+                batch.append(value)
+                if len(batch) >= batch_size:
+                    out.append(flush())
+            elif event == 'items_end':
+                if batch:
+                    out.append(flush())
+                out.append(']')
+                ready = True
+            elif event == 'end':
+                out.append('}')
+        return out
+
+    held = []
+    for chunk in chunks:
+        held += rewrite(decoder.decode(chunk))
+        if ready and held:
+            yield ''.join(held).encode()
+            held = []
+    held += rewrite(decoder.decode(b'', final=True), final=True)
+    if held:
+        yield ''.join(held).encode()
@@ -0,0 +1,15 @@
+import contextvars
+import os
+
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+FANOUT_WORKERS = int(os.getenv('BLOG_GATEWAY_FANOUT_WORKERS', '32'))
+
+EXECUTOR = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix='fanout')
+
+
+# Tasks submitted here must not wait on other fan-out tasks, otherwise a saturated pool deadlocks.
+# They run in a copy of the caller's context, so the request deadline applies to them too.
+def fan_out(func, *args, **kwargs) -> Future:
+    return EXECUTOR.submit(contextvars.copy_context().run, func, *args, **kwargs)
@@ -0,0 +1,60 @@
+import threading
+import time
+
+from rest_framework import status
+
+from .spool import Spool
+
+
+class JobExecutor:
+    def __init__(self, spool: Spool, handlers: dict, workers: int, deadline: float):
+        self.spool = spool
+        self.handlers = handlers
+        self.workers = workers
+        self.deadline = deadline
+        self.lock = threading.Lock()
+        self.completed = 0
+        self.retries = 0
+        self.failed = 0
+
+    def start(self):
+        for _ in range(self.workers):
+            threading.Thread(target=self.run, daemon=True).start()
+
+    def submit(self, service: str, method: str, path: str, payload: dict | list | None = None) -> bool:
+        return self.spool.put(service, method, path, payload)
+
+    def count(self, counter: str):
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    # The lease outlives a typical call, but the timeout bounds each connect and read rather than the whole call,
+    # so a slow task can be handed to a second worker while the first one is still sending it.
+    # Redelivery is safe because every event carries its own id and the services ignore ids they already have.
+    def run(self):
+        while True:
+            task = self.spool.take(lease=2 * self.deadline)
+            try:
+                res = self.handlers[task.service](task.method, task.path, json=task.payload, timeout=self.deadline)
+            except Exception as e:
+                print(e)
+                print(f'RETRY TASK {task.id}')
+                self.count('retries' if self.spool.retry(task, repr(e)) else 'failed')
+                continue
+            if res.status_code >= status.HTTP_400_BAD_REQUEST:
+                self.spool.dead_letter(task, f'{res.status_code}: {res.text}')
+                self.count('failed')
+            else:
+                self.spool.ack(task)
+                self.count('completed')
+
+    def stats(self) -> dict:
+        oldest = self.spool.oldest_pending()
+        with self.lock:
+            counters = {'completed': self.completed, 'retries': self.retries, 'failed': self.failed}
+        return {
+            'workers': self.workers,
+            'lag': 0 if oldest is None else max(time.time() - oldest, 0),
+            **self.spool.stats(),
+            **counters,
+        }
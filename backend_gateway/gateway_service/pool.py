@@ -0,0 +1,78 @@
+import os
+import threading
+import time
+
+from http.cookiejar import DefaultCookiePolicy
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from .deadline import deadline_headers, remaining
+
+
+POOL_SIZE = int(os.getenv('BLOG_GATEWAY_POOL_SIZE', '32'))
+POOL_CONNECT_TIMEOUT = float(os.getenv('BLOG_GATEWAY_POOL_CONNECT_TIMEOUT', '3.05'))
+POOL_READ_TIMEOUT = float(os.getenv('BLOG_GATEWAY_POOL_READ_TIMEOUT', '30'))
+POOL_MAX_IDLE = float(os.getenv('BLOG_GATEWAY_POOL_MAX_IDLE', '60'))
+
+
+class PoolStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit: bool):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def as_dict(self) -> dict:
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+
+def counting_pool_class(base: type[HTTPConnectionPool], stats: PoolStats) -> type[HTTPConnectionPool]:
+    # A checked out connection with an open socket is a reused keep-alive connection (hit),
+    # one without a socket has to be connected first (miss).
+    class CountingConnectionPool(base):
+        def _get_conn(self, timeout=None):
+            conn = super()._get_conn(timeout)
+            if conn.sock is not None and time.monotonic() - getattr(conn, 'idle_since', 0) > POOL_MAX_IDLE:
+                conn.close()
+            stats.record(conn.sock is not None)
+            return conn
+
+        def _put_conn(self, conn):
+            if conn is not None:
+                conn.idle_since = time.monotonic()
+            super()._put_conn(conn)
+
+    return CountingConnectionPool
+
+
+class ServicePool:
+    def __init__(self, name: str, url: str):
+        self.name = name
+        self.url = url
+        self.stats = PoolStats()
+
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+        adapter.poolmanager.pool_classes_by_scheme = {
+            'http': counting_pool_class(HTTPConnectionPool, self.stats),
+            'https': counting_pool_class(HTTPSConnectionPool, self.stats),
+        }
+
+        self.session = requests.Session()
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        self.session.mount(url, adapter)
+
+    def request(self, method: str, path: str, **kwargs) -> requests.Response:
+        if (left := remaining()) is not None:
+            kwargs.setdefault('timeout', (min(POOL_CONNECT_TIMEOUT, left), min(POOL_READ_TIMEOUT, left)))
+            kwargs['headers'] = deadline_headers(kwargs.get('headers'))
+        kwargs.setdefault('timeout', (POOL_CONNECT_TIMEOUT, POOL_READ_TIMEOUT))
+        return self.session.request(method, f'{self.url}{path}', **kwargs)
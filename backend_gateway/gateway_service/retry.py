@@ -0,0 +1,101 @@
+import asyncio
+import os
+import random
+import threading
+import time
+
+from collections import defaultdict
+
+from .deadline import remaining
+
+
+RETRY_ATTEMPTS = int(os.getenv('BLOG_GATEWAY_RETRY_ATTEMPTS', '2'))
+RETRY_BACKOFF = float(os.getenv('BLOG_GATEWAY_RETRY_BACKOFF', '0.05'))
+RETRY_MAX_BACKOFF = float(os.getenv('BLOG_GATEWAY_RETRY_MAX_BACKOFF', '1'))
+RETRY_BUDGET_RATIO = float(os.getenv('BLOG_GATEWAY_RETRY_BUDGET_RATIO', '0.1'))
+RETRY_BUDGET_RESERVE = float(os.getenv('BLOG_GATEWAY_RETRY_BUDGET_RESERVE', '10'))
+
+# GET and DELETE by uid are idempotent, so repeating them cannot apply a change twice
+RETRY_METHODS = {'GET', 'DELETE'}
+
+
+# Every request earns a fraction of a retry and every retry spends a whole one,
+# so over time retries stay below that fraction of the traffic (plus a small reserve for quiet periods).
+class RetryBudget:
+    def __init__(self, ratio: float, reserve: float):
+        self.ratio = ratio
+        self.reserve = reserve
+        self.tokens = reserve
+        self.lock = threading.Lock()
+        self.services = defaultdict(lambda: {'requests': 0, 'retries': 0, 'exhausted': 0})
+
+    def deposit(self, service: str):
+        with self.lock:
+            self.tokens = min(self.tokens + self.ratio, self.reserve)
+            self.services[service]['requests'] += 1
+
+    def withdraw(self, service: str) -> bool:
+        with self.lock:
+            if self.tokens < 1:
+                self.services[service]['exhausted'] += 1
+                return False
+            self.tokens -= 1
+            self.services[service]['retries'] += 1
+            return True
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                'tokens': round(self.tokens, 2),
+                'services': {name: dict(stats) for name, stats in self.services.items()},
+            }
+
+
+RETRY_BUDGET = RetryBudget(RETRY_BUDGET_RATIO, RETRY_BUDGET_RESERVE)
+
+
+def backoff(attempt: int) -> float | None:
+    delay = random.uniform(0, min(RETRY_MAX_BACKOFF, RETRY_BACKOFF * 2 ** attempt))
+    left = remaining()
+    return None if left is not None and delay >= left else delay
+
+
+def retry_delay(pool, method: str, attempt: int, failed: bool) -> float | None:
+    if not failed or method not in RETRY_METHODS or attempt >= RETRY_ATTEMPTS:
+        return None
+    if (delay := backoff(attempt)) is None or not RETRY_BUDGET.withdraw(pool.name):
+        return None
+    return delay
+
+
+def with_retries(pool, errors: tuple, method: str, path: str, **kwargs):
+    RETRY_BUDGET.deposit(pool.name)
+    attempt = 0
+    while True:
+        try:
+            res = pool.request(method, path, **kwargs)
+        except errors:
+            if (delay := retry_delay(pool, method, attempt, True)) is None:
+                raise
+        else:
+            if (delay := retry_delay(pool, method, attempt, res.status_code >= 500)) is None:
+                return res
+            res.close()
+        time.sleep(delay)
+        attempt += 1
+
+
+async def with_retries_async(pool, errors: tuple, method: str, path: str, **kwargs):
+    RETRY_BUDGET.deposit(pool.name)
+    attempt = 0
+    while True:
+        try:
+            res = await pool.request(method, path, **kwargs)
+        except errors:
+            if (delay := retry_delay(pool, method, attempt, True)) is None:
+                raise
+        else:
+            if (delay := retry_delay(pool, method, attempt, res.status_code >= 500)) is None:
+                return res
+        await asyncio.sleep(delay)
+        attempt += 1
@@ -0,0 +1,85 @@
+import asyncio
+import threading
+
+from concurrent.futures import Future
+
+
+def params_key(params) -> tuple:
+    if not params:
+        return ()
+    if hasattr(params, 'lists'):
+        pairs = params.lists()
+    elif isinstance(params, (list, tuple)):
+        pairs = ((key, [value]) for key, value in params)
+    else:
+        pairs = ((key, value if isinstance(value, (list, tuple)) else [value]) for key, value in params.items())
+    return tuple(sorted((key, str(value)) for key, values in pairs for value in values))
+
+
+class SingleFlight:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    # Concurrent callers with the same key wait for the first caller's result instead of repeating the call.
+    def do(self, key, func, *args, **kwargs):
+        with self.lock:
+            future = self.calls.get(key)
+            leader = future is None
+            if leader:
+                future = self.calls[key] = Future()
+                self.executed += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self.lock:
+                del self.calls[key]
+
+    async def do_async(self, key, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        key = (loop, key)
+        with self.lock:
+            future = self.calls.get(key)
+            leader = future is None
+            if leader:
+                future = self.calls[key] = loop.create_future()
+                self.executed += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return await asyncio.shield(future)
+
+        try:
+            result = await func(*args, **kwargs)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self.lock:
+                del self.calls[key]
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {'executed': self.executed, 'coalesced': self.coalesced, 'in_flight': len(self.calls)}
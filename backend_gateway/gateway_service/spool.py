@@ -0,0 +1,135 @@
+import json
+import sqlite3
+import threading
+import time
+
+from dataclasses import dataclass
+
+
+@dataclass
+class SpoolTask:
+    id: int
+    service: str
+    method: str
+    path: str
+    payload: dict | list | None
+    attempts: int
+    created_at: float
+
+
+class Spool:
+    def __init__(self, path: str, max_size: int, max_attempts: int, backoff: float, max_backoff: float):
+        self.max_size = max_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.dropped = 0
+
+        self.condition = threading.Condition()
+        self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('''
+            CREATE TABLE IF NOT EXISTS task (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                service TEXT NOT NULL,
+                method TEXT NOT NULL,
+                path TEXT NOT NULL,
+                payload TEXT,
+                state TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                available_at REAL NOT NULL,
+                last_error TEXT
+            )
+        ''')
+        columns = {row[1] for row in self.connection.execute('PRAGMA table_info(task)')}
+        if 'lease_until' not in columns:
+            self.connection.execute('ALTER TABLE task ADD COLUMN lease_until REAL NOT NULL DEFAULT 0')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS task_state_available_at ON task (state, available_at)')
+
+    def _count(self, *states: str) -> int:
+        placeholders = ', '.join('?' * len(states))
+        query = f'SELECT COUNT(*) FROM task WHERE state IN ({placeholders})'
+        return self.connection.execute(query, states).fetchone()[0]
+
+    def put(self, service: str, method: str, path: str, payload: dict | list | None = None) -> bool:
+        with self.condition:
+            if self._count('pending', 'running') >= self.max_size:
+                self.dropped += 1
+                return False
+            now = time.time()
+            self.connection.execute(
+                'INSERT INTO task (service, method, path, payload, created_at, available_at) VALUES (?, ?, ?, ?, ?, ?)',
+                (service, method, path, json.dumps(payload), now, now),
+            )
+            self.condition.notify()
+        return True
+
+    # A claimed task is leased, not removed: while the lease holds nobody else runs it,
+    # and once it expires (e.g. the process died mid-call) the task is replayed.
+    def take(self, lease: float) -> SpoolTask:
+        with self.condition:
+            while True:
+                now = time.time()
+                row = self.connection.execute(
+                    'SELECT id, service, method, path, payload, attempts, created_at, available_at '
+                    'FROM task WHERE state = ? OR (state = ? AND lease_until <= ?) ORDER BY available_at, id LIMIT 1',
+                    ('pending', 'running', now),
+                ).fetchone()
+                if row is None:
+                    self.condition.wait(1)
+                    continue
+                if row[7] > now:
+                    self.condition.wait(min(row[7] - now, 1))
+                    continue
+                claimed = self.connection.execute(
+                    "UPDATE task SET state = 'running', lease_until = ? "
+                    "WHERE id = ? AND (state = 'pending' OR lease_until <= ?)",
+                    (now + lease, row[0], now),
+                ).rowcount
+                if claimed:
+                    return SpoolTask(row[0], row[1], row[2], row[3], json.loads(row[4]), row[5], row[6])
+
+    def ack(self, task: SpoolTask):
+        with self.condition:
+            self.connection.execute('DELETE FROM task WHERE id = ?', (task.id,))
+
+    def dead_letter(self, task: SpoolTask, error: str):
+        with self.condition:
+            self.connection.execute(
+                "UPDATE task SET state = 'dead', attempts = ?, last_error = ? WHERE id = ?",
+                (task.attempts + 1, error, task.id),
+            )
+            self.connection.execute(
+                "DELETE FROM task WHERE state = 'dead' AND id NOT IN "
+                "(SELECT id FROM task WHERE state = 'dead' ORDER BY id DESC LIMIT ?)",
+                (self.max_size,),
+            )
+
+    def retry(self, task: SpoolTask, error: str) -> bool:
+        attempts = task.attempts + 1
+        if attempts >= self.max_attempts:
+            self.dead_letter(task, error)
+            return False
+        delay = min(self.backoff * 2 ** (attempts - 1), self.max_backoff)
+        with self.condition:
+            self.connection.execute(
+                "UPDATE task SET state = 'pending', attempts = ?, available_at = ?, last_error = ? WHERE id = ?",
+                (attempts, time.time() + delay, error, task.id),
+            )
+            self.condition.notify()
+        return True
+
+    def oldest_pending(self) -> float | None:
+        with self.condition:
+            return self.connection.execute("SELECT MIN(created_at) FROM task WHERE state = 'pending'").fetchone()[0]
+
+    def stats(self) -> dict:
+        with self.condition:
+            return {
+                'pending': self._count('pending'),
+                'running': self._count('running'),
+                'dead': self._count('dead'),
+                'dropped': self.dropped,
+                'max_size': self.max_size,
+            }
@@ -0,0 +1,221 @@
+import asyncio
+import threading
+import time
+
+import requests
+
+from collections import OrderedDict
+from functools import wraps
+
+from requests.structures import CaseInsensitiveDict
+
+from .breaker import BREAKERS
+from .deadline import DEADLINE
+from .fanout import fan_out
+from .singleflight import params_key
+
+
+STALE = '110 - "Response is Stale"'
+REVALIDATION_FAILED = '111 - "Revalidation Failed"'
+
+REFRESH_TASKS = set()
+
+# POSTs that change nothing a GET could have cached: lookups, and view events that only append to statistics
+# (their listings are bounded by the soft TTL anyway, and the job pool posts them every flush interval)
+READ_ONLY_POSTS = {'/api/v1/users/bulk/', '/api/v1/user-by-token/', '/api/v1/statistics/bulk/'}
+
+
+class StaleEntry:
+    def __init__(self, res):
+        self.stored_at = time.monotonic()
+        self.status_code = res.status_code
+        self.headers = dict(res.headers.items())
+        self.content = res.content
+
+    def age(self) -> float:
+        return time.monotonic() - self.stored_at
+
+    # every caller gets its own response object, so the headers added here never leak into the cache
+    def response(self, warning: str | None = None) -> requests.Response:
+        res = requests.Response()
+        res.status_code = self.status_code
+        res.headers = CaseInsensitiveDict(self.headers)
+        res.headers['Age'] = str(int(self.age()))
+        if warning is not None:
+            res.headers['Warning'] = warning
+        res._content = self.content
+        return res
+
+
+class StaleCache:
+    def __init__(self, maxsize: int, soft_ttl: float, max_stale: float):
+        self.maxsize = maxsize
+        self.soft_ttl = soft_ttl
+        self.max_stale = max_stale
+        self.lock = threading.Lock()
+        self.items = OrderedDict()
+        self.refreshing = set()
+        self.fresh_hits = 0
+        self.stale_hits = 0
+        self.outage_hits = 0
+        self.refreshes = 0
+        self.misses = 0
+
+    def get(self, key) -> StaleEntry | None:
+        with self.lock:
+            entry = self.items.get(key)
+            if entry is not None and entry.age() > self.max_stale:
+                del self.items[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+            else:
+                self.items.move_to_end(key)
+            return entry
+
+    def set(self, key, res):
+        if res.status_code != 200:
+            return
+        with self.lock:
+            self.items[key] = StaleEntry(res)
+            self.items.move_to_end(key)
+            while len(self.items) > self.maxsize:
+                self.items.popitem(last=False)
+
+    # a write through a service may change anything it serves, so its entries are dropped
+    def invalidate(self, service: str):
+        with self.lock:
+            for key in [key for key in self.items if key[0] == service]:
+                del self.items[key]
+
+    def serve(self, entry: StaleEntry, opened: bool) -> tuple[requests.Response, bool]:
+        with self.lock:
+            if entry.age() < self.soft_ttl:
+                self.fresh_hits += 1
+                return entry.response(), False
+            if opened:
+                self.outage_hits += 1
+                return entry.response(REVALIDATION_FAILED), False
+            self.stale_hits += 1
+            return entry.response(STALE), True
+
+    def start_refresh(self, key) -> bool:
+        with self.lock:
+            if key in self.refreshing:
+                return False
+            self.refreshing.add(key)
+            self.refreshes += 1
+            return True
+
+    def finish_refresh(self, key):
+        with self.lock:
+            self.refreshing.discard(key)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                'size': len(self.items),
+                'maxsize': self.maxsize,
+                'fresh_hits': self.fresh_hits,
+                'stale_hits': self.stale_hits,
+                'outage_hits': self.outage_hits,
+                'refreshes': self.refreshes,
+                'misses': self.misses,
+            }
+
+
+# A page assembled from cached answers is as old as the oldest of them and carries all their warnings.
+def carry_staleness(response, *upstream):
+    ages = [int(res.headers['Age']) for res in upstream if 'Age' in res.headers]
+    warnings = [res.headers['Warning'] for res in upstream if 'Warning' in res.headers]
+    if ages:
+        response['Age'] = str(max(ages))
+    if warnings:
+        response['Warning'] = ', '.join(dict.fromkeys(warnings))
+    return response
+
+
+def is_write(method: str, path: str) -> bool:
+    return method != 'GET' and not (method == 'POST' and path in READ_ONLY_POSTS)
+
+
+def cache_key(func, method: str, path: str, kwargs: dict) -> tuple | None:
+    if method != 'GET' or not kwargs.keys() <= {'params'}:
+        return None
+    return func.__name__, path, params_key(kwargs.get('params'))
+
+
+def stale_while_revalidate(cache: StaleCache | None):
+    def decorator(func):
+        if cache is None:
+            return func
+
+        # a refresh outlives the request that triggered it, so it is not bound by that request's deadline
+        def refresh(key, method: str, path: str, **kwargs):
+            DEADLINE.set(None)
+            try:
+                cache.set(key, func(method, path, **kwargs))
+            except Exception as e:
+                print(f'{func.__name__}: refresh of {path} failed: {e}')
+            finally:
+                cache.finish_refresh(key)
+
+        @wraps(func)
+        def wrapper(method: str, path: str, **kwargs):
+            if (key := cache_key(func, method, path, kwargs)) is None:
+                if is_write(method, path):
+                    cache.invalidate(func.__name__)
+                return func(method, path, **kwargs)
+
+            if (entry := cache.get(key)) is not None:
+                res, expired = cache.serve(entry, BREAKERS[func.__name__].opened)
+                if expired and cache.start_refresh(key):
+                    fan_out(refresh, key, method, path, **kwargs)
+                return res
+
+            res = func(method, path, **kwargs)
+            cache.set(key, res)
+            return res
+
+        return wrapper
+
+    return decorator
+
+
+def async_stale_while_revalidate(cache: StaleCache | None, sync_request):
+    def decorator(func):
+        if cache is None:
+            return func
+
+        async def refresh(key, method: str, path: str, **kwargs):
+            DEADLINE.set(None)
+            try:
+                cache.set(key, await func(method, path, **kwargs))
+            except Exception as e:
+                print(f'{sync_request.__name__}: refresh of {path} failed: {e}')
+            finally:
+                cache.finish_refresh(key)
+
+        # keyed like the sync wrapper, so both deployment modes share entries
+        @wraps(func)
+        async def wrapper(method: str, path: str, **kwargs):
+            if (key := cache_key(sync_request, method, path, kwargs)) is None:
+                if is_write(method, path):
+                    cache.invalidate(sync_request.__name__)
+                return await func(method, path, **kwargs)
+
+            if (entry := cache.get(key)) is not None:
+                res, expired = cache.serve(entry, await BREAKERS[sync_request.__name__].opened_async())
+                if expired and cache.start_refresh(key):
+                    task = asyncio.get_running_loop().create_task(refresh(key, method, path, **kwargs))
+                    REFRESH_TASKS.add(task)
+                    task.add_done_callback(REFRESH_TASKS.discard)
+                return res
+
+            res = await func(method, path, **kwargs)
+            cache.set(key, res)
+            return res
+
+        return wrapper
+
+    return decorator
@@ -1,3 +1,439 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import uuid
 
-# Create your tests here.
+from unittest import mock
+
+import requests
+
+from asgiref.sync import async_to_sync
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase
+
+from . import async_views, retry
+from .breaker import BREAKER_MIN_CALLS, BREAKER_PROBES, BREAKER_RECOVERY_TIMEOUT, CLOSED, HALF_OPEN, OPEN
+from .breaker import BREAKERS, Breaker, BreakerStore, CircuitOpenError
+from .bulkhead import BULKHEADS, AsyncBulkhead, Bulkhead, BulkheadFull
+from .enrich import EnrichmentError, PageParser, enrich_page
+from .retry import RetryBudget, with_retries
+from .singleflight import SingleFlight
+from .spool import Spool
+from .stale import STALE, StaleEntry
+from .views import USER_CACHE
+
+
+def split(data: bytes, size: int) -> list[bytes]:
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def mark(items):
+    for item in items:
+        item['author'] = f'user-{item["author_uid"]}'
+
+
+class PageParserTest(SimpleTestCase):
+    def events(self, chunks: list[str]) -> list:
+        parser = PageParser()
+        events = []
+        for chunk in chunks:
+            events += parser.feed(chunk)
+        return events + list(parser.feed('', final=True))
+
+    def test_number_split_at_chunk_boundary(self):
+        for chunks in (['{"a": 1.', '5, "items": []}'], ['{"a": 1e', '3, "items": []}'],
+                       ['{"a": -2.5E', '+2, "items": []}']):
+            events = self.events(chunks)
+            self.assertEqual(events[1], ('field', ('a', json.loads(''.join(chunks))['a'])))
+
+    def test_truncated_page(self):
+        with self.assertRaises(ValueError):
+            self.events(['{"items": [1, 2'])
+
+
+class EnrichPageTest(SimpleTestCase):
+    def page(self, count: int) -> dict:
+        rng = random.Random(count)
+        return {
+            'items_count': count,
+            'ratio': rng.random() * 1e-7,
+            'big': -rng.randint(0, 10 ** 12),
+            'flag': True,
+            'next_page_number': None,
+            'items': [{
+                'id': i,
+                'author_uid': rng.randint(0, 9),
+                'rating': rng.uniform(-100, 100),
+                'title': 'заголовок "{}" \\ ✓'.format(i),
+                'tags': ['a', 'b'][:i % 3],
+                'meta': {'nested': [1.5e10, {'x': None}]},
+            } for i in range(count)],
+        }
+
+    def test_chunk_size_fuzz(self):
+        for count in (0, 1, 7):
+            page = self.page(count)
+            data = json.dumps(page, ensure_ascii=False).encode()
+            expected = json.loads(json.dumps(page))
+            mark(expected['items'])
+            for size in range(1, 40):
+                with self.subTest(count=count, size=size):
+                    out = b''.join(enrich_page(split(data, size), mark, batch_size=3))
+                    self.assertEqual(out.decode(), json.dumps(expected))
+
+    def test_nothing_is_sent_before_the_first_batch(self):
+        data = json.dumps(self.page(300)).encode()
+
+        def fail(items):
+            raise EnrichmentError(HttpResponse(status=503))
+
+        body = enrich_page(split(data, 1024), fail, batch_size=100)
+        with self.assertRaises(EnrichmentError):
+            next(body)
+
+    def test_first_output_contains_enriched_items(self):
+        data = json.dumps(self.page(300)).encode()
+        first = next(enrich_page(split(data, 1024), mark, batch_size=100))
+        self.assertIn(b'"author": ', first)
+
+
+def upstream(data, age: float = 0, warning: str | None = None) -> requests.Response:
+    res = requests.Response()
+    res.status_code = 200
+    res.headers['Content-Type'] = 'application/json'
+    res._content = json.dumps(data).encode()
+    entry = StaleEntry(res)
+    entry.stored_at -= age
+    return entry.response(warning)
+
+
+class StaleHeadersTest(SimpleTestCase):
+    def setUp(self):
+        self.author = str(uuid.uuid4())
+        USER_CACHE.set(self.author, {'id': self.author, 'username': 'author'})
+        self.uid = uuid.uuid4()
+        self.publication = upstream({'id': str(self.uid), 'author_uid': self.author}, age=30, warning=STALE)
+        self.comments = upstream({'items_count': 0, 'items': []}, age=4)
+
+    def request(self, method: str, path: str, **kwargs):
+        return self.publication if path.startswith('/api/v1/publications/') else self.comments
+
+    async def request_async(self, method: str, path: str, **kwargs):
+        return self.request(method, path, **kwargs)
+
+    def test_assembled_publication_carries_staleness(self):
+        with mock.patch('gateway_service.views.publication_request', self.request), \
+                mock.patch('gateway_service.views.record_view'):
+            response = self.client.get(f'/api/v1/publications/{self.uid}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Age'], '30')
+        self.assertEqual(response['Warning'], STALE)
+
+    def test_async_publication_carries_staleness(self):
+        request = RequestFactory().get(f'/api/v1/publications/{self.uid}/')
+        with mock.patch.object(async_views, 'publication_request', self.request_async), \
+                mock.patch.object(async_views, 'record_view'):
+            response = async_to_sync(async_views.publication)(request, uid=self.uid)
+        self.assertEqual(response['Age'], '30')
+        self.assertEqual(response['Warning'], STALE)
+
+    def test_fresh_page_has_no_warning(self):
+        self.publication = upstream({'id': str(self.uid), 'author_uid': self.author})
+        self.comments = upstream({'items_count': 0, 'items': []})
+        with mock.patch('gateway_service.views.publication_request', self.request), \
+                mock.patch('gateway_service.views.record_view'):
+            response = self.client.get(f'/api/v1/publications/{self.uid}/')
+        self.assertEqual(response['Age'], '0')
+        self.assertFalse(response.has_header('Warning'))
+
+
+class BreakerTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.store = BreakerStore(os.path.join(directory.name, 'breaker.sqlite3'))
+        self.addCleanup(self.store.connection.close)
+        self.breaker = Breaker(f'test-{uuid.uuid4()}', self.store)
+        self.addCleanup(BREAKERS.pop, self.breaker.name, None)
+
+    def call(self, failed: bool = False):
+        with self.breaker.guard():
+            if failed:
+                raise requests.ConnectionError()
+
+    def fail(self, times: int):
+        for _ in range(times):
+            with self.assertRaises(requests.ConnectionError):
+                self.call(failed=True)
+
+    # moves the opening back, as if the recovery timeout had passed
+    def recover(self):
+        with self.store.lock:
+            self.store.connection.execute('UPDATE breaker SET opened_at = opened_at - ? WHERE name = ?',
+                                          (BREAKER_RECOVERY_TIMEOUT, self.breaker.name))
+
+    def test_trips_on_failures(self):
+        self.call()
+        self.fail(BREAKER_MIN_CALLS)
+        with self.assertRaises(CircuitOpenError):
+            self.call()
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertTrue(self.breaker.opened)
+
+    def test_closes_after_successful_probes(self):
+        self.fail(BREAKER_MIN_CALLS)
+        self.breaker.sync(force=True)
+        self.recover()
+
+        self.call()
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        for _ in range(BREAKER_PROBES - 1):
+            self.call()
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.call()
+
+    def test_probes_are_limited(self):
+        self.fail(BREAKER_MIN_CALLS)
+        self.breaker.sync(force=True)
+        self.recover()
+        for _ in range(BREAKER_PROBES):
+            self.assertTrue(self.store.claim_probe(self.breaker.name, time.time()))
+        self.assertFalse(self.store.claim_probe(self.breaker.name, time.time()))
+
+    def test_reopens_when_a_probe_fails(self):
+        self.fail(BREAKER_MIN_CALLS)
+        self.breaker.sync(force=True)
+        self.recover()
+
+        self.fail(1)
+        self.assertEqual(self.breaker.state, OPEN)
+        with self.assertRaises(CircuitOpenError):
+            self.call()
+
+    def test_breakers_share_the_store(self):
+        other = Breaker(self.breaker.name, self.store)
+        self.fail(BREAKER_MIN_CALLS)
+        self.breaker.sync(force=True)
+        other.sync(force=True)
+        self.assertEqual(other.state, OPEN)
+
+
+class SpoolTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'spool.sqlite3')
+        self.spool = self.open()
+
+    def open(self) -> Spool:
+        spool = Spool(self.path, max_size=10, max_attempts=3, backoff=10, max_backoff=15)
+        self.addCleanup(spool.connection.close)
+        return spool
+
+    def delay(self, task) -> float:
+        query = 'SELECT available_at FROM task WHERE id = ?'
+        return self.spool.connection.execute(query, (task.id,)).fetchone()[0] - time.time()
+
+    # makes a backed-off task available again instead of waiting out its delay
+    def release(self, task):
+        self.spool.connection.execute('UPDATE task SET available_at = 0 WHERE id = ?', (task.id,))
+
+    def test_tasks_survive_a_restart(self):
+        self.spool.put('statistics', 'POST', '/api/v1/statistics/bulk/', [{'id': 1}])
+        task = self.open().take(lease=60)
+        self.assertEqual(task.path, '/api/v1/statistics/bulk/')
+        self.assertEqual(task.payload, [{'id': 1}])
+
+    def test_backoff(self):
+        self.spool.put('statistics', 'POST', '/')
+        task = self.spool.take(lease=60)
+        self.assertTrue(self.spool.retry(task, 'error'))
+        self.assertAlmostEqual(self.delay(task), 10, delta=1)
+
+        self.release(task)
+        task = self.spool.take(lease=60)
+        self.assertEqual(task.attempts, 1)
+        self.assertTrue(self.spool.retry(task, 'error'))
+        self.assertAlmostEqual(self.delay(task), 15, delta=1)
+
+    def test_dead_letter_after_max_attempts(self):
+        self.spool.put('statistics', 'POST', '/')
+        for _ in range(3):
+            task = self.spool.take(lease=60)
+            retried = self.spool.retry(task, 'error')
+            self.release(task)
+        self.assertFalse(retried)
+        self.assertEqual(self.spool.stats()['dead'], 1)
+        self.assertEqual(self.spool.stats()['pending'], 0)
+
+    def test_expired_lease_is_replayed(self):
+        self.spool.put('statistics', 'POST', '/')
+        task = self.spool.take(lease=0.05)
+        self.assertEqual(self.spool.stats()['running'], 1)
+        time.sleep(0.1)
+        self.assertEqual(self.spool.take(lease=60).id, task.id)
+
+    def test_full_spool_drops(self):
+        for _ in range(10):
+            self.assertTrue(self.spool.put('statistics', 'POST', '/'))
+        self.assertFalse(self.spool.put('statistics', 'POST', '/'))
+        self.assertEqual(self.spool.stats()['dropped'], 1)
+
+
+class SingleFlightTest(SimpleTestCase):
+    def test_concurrent_calls_share_one_execution(self):
+        flight = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def call():
+            calls.append(1)
+            started.set()
+            release.wait(1)
+            return object()
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(flight.do('key', call)))
+        leader.start()
+        started.wait(1)
+        followers = [threading.Thread(target=lambda: results.append(flight.do('key', call))) for _ in range(3)]
+        for follower in followers:
+            follower.start()
+        while flight.stats()['coalesced'] < 3:
+            time.sleep(0.001)
+        release.set()
+        for thread in [leader, *followers]:
+            thread.join(1)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(set(map(id, results))), 1)
+        self.assertEqual(flight.stats(), {'executed': 1, 'coalesced': 3, 'in_flight': 0})
+
+    def test_error_reaches_every_caller_and_is_not_kept(self):
+        flight = SingleFlight()
+        with self.assertRaises(ValueError):
+            flight.do('key', lambda: int('x'))
+        self.assertEqual(flight.do('key', lambda: 1), 1)
+
+
+class BulkheadTest(SimpleTestCase):
+    def bulkhead(self, cls):
+        settings = {'BLOG_GATEWAY_TEST_CONCURRENCY': '1', 'BLOG_GATEWAY_TEST_QUEUE': '1',
+                    'BLOG_GATEWAY_TEST_QUEUE_TIMEOUT': '0.1'}
+        with mock.patch.dict(os.environ, settings):
+            bulkhead = cls('test')
+        self.addCleanup(BULKHEADS.remove, bulkhead)
+        return bulkhead
+
+    def test_queue_times_out(self):
+        bulkhead = self.bulkhead(Bulkhead)
+        bulkhead.acquire()
+        with self.assertRaises(BulkheadFull):
+            bulkhead.acquire()
+        self.assertEqual(bulkhead.stats()['timed_out'], 1)
+
+    def test_full_queue_rejects_and_release_admits_the_waiter(self):
+        bulkhead = self.bulkhead(Bulkhead)
+        bulkhead.queue_timeout = 5
+        bulkhead.acquire()
+        waiter = threading.Thread(target=bulkhead.acquire)
+        waiter.start()
+        while not bulkhead.queued():
+            time.sleep(0.001)
+
+        with self.assertRaises(BulkheadFull):
+            bulkhead.acquire()
+        self.assertEqual(bulkhead.stats()['rejected'], 1)
+        bulkhead.release()
+        waiter.join(1)
+        self.assertFalse(waiter.is_alive())
+        self.assertEqual(bulkhead.stats()['in_flight'], 1)
+
+    def test_async_bulkhead(self):
+        bulkhead = self.bulkhead(AsyncBulkhead)
+
+        async def scenario():
+            await bulkhead.acquire()
+            with self.assertRaises(BulkheadFull):
+                await bulkhead.acquire()
+            waiter = asyncio.create_task(bulkhead.acquire())
+            await asyncio.sleep(0)
+            bulkhead.release()
+            await waiter
+            return bulkhead.stats()
+
+        stats = asyncio.run(scenario())
+        self.assertEqual((stats['in_flight'], stats['queued'], stats['timed_out']), (1, 0, 1))
+
+
+class FlakyPool:
+    name = 'test'
+
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.calls = 0
+
+    def request(self, method: str, path: str, **kwargs):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise requests.ConnectionError()
+        return HttpResponse()
+
+
+class RetryTest(SimpleTestCase):
+    def test_budget(self):
+        budget = RetryBudget(ratio=0.5, reserve=2)
+        self.assertTrue(budget.withdraw('test'))
+        self.assertTrue(budget.withdraw('test'))
+        self.assertFalse(budget.withdraw('test'))
+        budget.deposit('test')
+        budget.deposit('test')
+        self.assertTrue(budget.withdraw('test'))
+        self.assertEqual(budget.stats()['services']['test'], {'requests': 2, 'retries': 3, 'exhausted': 1})
+
+    def test_retries_idempotent_requests_within_the_budget(self):
+        with mock.patch.object(retry, 'RETRY_BUDGET', RetryBudget(ratio=0, reserve=1)):
+            pool = FlakyPool(failures=1)
+            self.assertEqual(with_retries(pool, (requests.ConnectionError,), 'GET', '/').status_code, 200)
+            self.assertEqual(pool.calls, 2)
+
+            pool = FlakyPool(failures=1)
+            with self.assertRaises(requests.ConnectionError):
+                with_retries(pool, (requests.ConnectionError,), 'GET', '/')
+            self.assertEqual(pool.calls, 1)
+
+    def test_does_not_retry_posts(self):
+        pool = FlakyPool(failures=1)
+        with self.assertRaises(requests.ConnectionError):
+            with_retries(pool, (requests.ConnectionError,), 'POST', '/')
+        self.assertEqual(pool.calls, 1)
+
+
+class UserPageTest(SimpleTestCase):
+    def session(self, users: list):
+        def request(method: str, path: str, **kwargs):
+            return upstream(users)
+        return mock.patch('gateway_service.views.session_request', request)
+
+    def test_missing_user_is_marked(self):
+        with self.session([]):
+            response = self.client.get('/api/v1/pages/user/nobody/')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {'detail': 'Not found.', 'user': None})
+
+    def test_missing_page_is_not_a_missing_user(self):
+        user = {'id': str(uuid.uuid4()), 'username': 'author'}
+
+        def publications(method: str, path: str, **kwargs):
+            res = upstream({'detail': 'Invalid page.'})
+            res.status_code = 404
+            return res
+
+        with self.session([user]), mock.patch('gateway_service.views.publication_request', publications):
+            response = self.client.get('/api/v1/pages/user/author/', {'page': 100})
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn('user', response.json())
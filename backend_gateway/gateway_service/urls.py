@@ -1,28 +1,56 @@
+import os
+
 from django.urls import path
 
-from .views import users, user, user_by_token
+from .deadline import with_deadline
+
+from .views import users, users_bulk, user, user_by_token
 from .views import tags, tag, tag_uid, votes, vote, Publications, Publication, comments, comment
 from .views import subscriptions, subscription
 from .views import statistics
+from .views import user_page, tag_page
+from .views import metrics
+
+
+publications = Publications.as_view()
+publication = Publication.as_view()
+
+# ASGI deployment mode: the proxy views await their upstream calls instead of holding a thread
+if os.getenv('BLOG_GATEWAY_ASGI', '0') == '1':
+    from .async_views import users, users_bulk, user_by_token
+    from .async_views import tags, votes, vote, publications, publication, comments
+    from .async_views import subscriptions
+    from .async_views import statistics
+    from .async_views import sync_fallback
+
+    user, tag, tag_uid, comment, subscription = map(sync_fallback, (user, tag, tag_uid, comment, subscription))
+    user_page, tag_page, metrics = map(sync_fallback, (user_page, tag_page, metrics))
 
 
+# every route has an overall budget in seconds for its upstream calls
 urlpatterns = [
-    path(r'users/', users),
-    path(r'users/<uuid:uid>/', user),
-    path(r'user-by-token/', user_by_token),
-
-    path(r'tags/', tags),
-    path(r'tags/<str:name>/', tag),
-    path(r'tags_uid/<uuid:uid>/', tag_uid),
-    path(r'votes/', votes),
-    path(r'vote/', vote),
-    path(r'publications/', Publications.as_view()),
-    path(r'publications/<uuid:uid>/', Publication.as_view()),
-    path(r'comments/', comments),
-    path(r'comments/<uuid:uid>/', comment),
-
-    path(r'subscriptions/', subscriptions),
-    path(r'subscriptions/<uuid:uid>/', subscription),
-
-    path(r'statistics/<uuid:uid>/', statistics),
+    path(r'users/', with_deadline(users, 5)),
+    path(r'users/bulk/', with_deadline(users_bulk, 3)),
+    path(r'users/<uuid:uid>/', with_deadline(user, 5)),
+    path(r'user-by-token/', with_deadline(user_by_token, 3)),
+
+    path(r'tags/', with_deadline(tags, 5)),
+    path(r'tags/<str:name>/', with_deadline(tag, 5)),
+    path(r'tags_uid/<uuid:uid>/', with_deadline(tag_uid, 5)),
+    path(r'votes/', with_deadline(votes, 5)),
+    path(r'vote/', with_deadline(vote, 5)),
+    path(r'publications/', with_deadline(publications, 10)),
+    path(r'publications/<uuid:uid>/', with_deadline(publication, 10)),
+    path(r'comments/', with_deadline(comments, 5)),
+    path(r'comments/<uuid:uid>/', with_deadline(comment, 5)),
+
+    path(r'subscriptions/', with_deadline(subscriptions, 5)),
+    path(r'subscriptions/<uuid:uid>/', with_deadline(subscription, 5)),
+
+    path(r'statistics/<uuid:uid>/', with_deadline(statistics, 10)),
+
+    path(r'pages/user/<str:username>/', with_deadline(user_page, 10)),
+    path(r'pages/tag/<str:name>/', with_deadline(tag_page, 10)),
+
+    path(r'metrics/', metrics),
 ]
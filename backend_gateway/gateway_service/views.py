@@ -1,95 +1,201 @@
 import json
 import os
-import queue
 import requests
-import threading
-import time
 import uuid
 
-from circuitbreaker import circuit, CircuitBreakerError
-from django.http import HttpResponse
+from pathlib import Path
+
+from django.http import HttpResponse, StreamingHttpResponse
 from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.request import Request
 from rest_framework.views import APIView
 
+from .breaker import BREAKERS, CircuitOpenError, circuit
+from .buffer import BatchBuffer
+from .bulkhead import BULKHEADS, Bulkhead, BulkheadFull, bulkhead
+from .cache import TTLCache
+from .conditional import RepresentationCache, conditional_response
+from .enrich import EnrichmentError, enrich_page
+from .fanout import fan_out
+from .jobs import JobExecutor
+from .pool import ServicePool
+from .retry import RETRY_BUDGET, with_retries
+from .singleflight import SingleFlight, params_key
+from .spool import Spool
+from .stale import StaleCache, carry_staleness, stale_while_revalidate
 
-QUEUE = queue.Queue()
 
+class ServiceUrl:
+    SESSION = os.getenv('BLOG_BACKEND_SESSION_URL', 'http://127.0.0.1:8082')
+    PUBLICATION = os.getenv('BLOG_BACKEND_PUBLICATION_URL', 'http://127.0.0.1:8083')
+    SUBSCRIPTION = os.getenv('BLOG_BACKEND_SUBSCRIPTION_URL', 'http://127.0.0.1:8084')
+    STATISTICS = os.getenv('BLOG_BACKEND_STATISTICS_URL', 'http://127.0.0.1:8085')
 
-def worker():
-    while True:
-        callback = QUEUE.get()
-        stop_event = threading.Event()
 
-        def call():
-            while not stop_event.is_set():
-                try:
-                    callback()
-                    break
-                except Exception as e:
-                    print(e)
-                    print('RETRY IN 5')
-                    time.sleep(5)
+SESSION_POOL = ServicePool('session', ServiceUrl.SESSION)
+PUBLICATION_POOL = ServicePool('publication', ServiceUrl.PUBLICATION)
+SUBSCRIPTION_POOL = ServicePool('subscription', ServiceUrl.SUBSCRIPTION)
+STATISTICS_POOL = ServicePool('statistics', ServiceUrl.STATISTICS)
+POOLS = [SESSION_POOL, PUBLICATION_POOL, SUBSCRIPTION_POOL, STATISTICS_POOL]
 
-        thread = threading.Thread(target=call)
-        thread.start()
-        thread.join(timeout=10)
-        if thread.is_alive():
-            stop_event.set()
-            thread.join()
-            QUEUE.put(callback)
-        QUEUE.task_done()
+STREAM_CHUNK_SIZE = int(os.getenv('BLOG_GATEWAY_STREAM_CHUNK_SIZE', '65536'))
+STREAM_PAGE_SIZE = int(os.getenv('BLOG_GATEWAY_STREAM_PAGE_SIZE', '200'))
+ENRICH_BATCH_SIZE = int(os.getenv('BLOG_GATEWAY_ENRICH_BATCH_SIZE', '100'))
 
+USER_CACHE_SIZE = int(os.getenv('BLOG_GATEWAY_USER_CACHE_SIZE', '4096'))
+USER_CACHE_TTL = float(os.getenv('BLOG_GATEWAY_USER_CACHE_TTL', '300'))
+USER_CACHE_MAX_STALE = float(os.getenv('BLOG_GATEWAY_USER_CACHE_MAX_STALE', '600'))
+USER_CACHE = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL, USER_CACHE_MAX_STALE)
 
-# turn-on the worker thread
-threading.Thread(target=worker).start()
+REPRESENTATION_CACHE_SIZE = int(os.getenv('BLOG_GATEWAY_REPRESENTATION_CACHE_SIZE', '1024'))
+REPRESENTATION_CACHE_TTL = float(os.getenv('BLOG_GATEWAY_REPRESENTATION_CACHE_TTL', '60'))
+REPRESENTATION_CACHE = RepresentationCache(REPRESENTATION_CACHE_SIZE, REPRESENTATION_CACHE_TTL)
 
 
-class ServiceUrl:
-    SESSION = os.getenv('BLOG_BACKEND_SESSION_URL', 'http://127.0.0.1:8082')
-    PUBLICATION = os.getenv('BLOG_BACKEND_PUBLICATION_URL', 'http://127.0.0.1:8083')
-    SUBSCRIPTION = os.getenv('BLOG_BACKEND_SUBSCRIPTION_URL', 'http://127.0.0.1:8084')
-    STATISTICS = os.getenv('BLOG_BACKEND_STATISTICS_URL', 'http://127.0.0.1:8085')
+SINGLE_FLIGHT = SingleFlight()
+
+# connection failures only: a read timeout means a slow service, which a retry would only load further
+RETRY_ERRORS = (requests.ConnectionError,)
 
+STALE_CACHE_ENABLED = os.getenv('BLOG_GATEWAY_STALE_CACHE', '0') == '1'
+STALE_CACHE_SIZE = int(os.getenv('BLOG_GATEWAY_STALE_CACHE_SIZE', '4096'))
+STALE_CACHE_SOFT_TTL = float(os.getenv('BLOG_GATEWAY_STALE_CACHE_SOFT_TTL', '5'))
+STALE_CACHE_MAX_STALE = float(os.getenv('BLOG_GATEWAY_STALE_CACHE_MAX_STALE', '600'))
+STALE_CACHE = StaleCache(STALE_CACHE_SIZE, STALE_CACHE_SOFT_TTL, STALE_CACHE_MAX_STALE) if STALE_CACHE_ENABLED else None
 
-def req(method: str, url: str, **kwargs) -> requests.Response:
-    res = requests.request(method, url, **kwargs)
+
+def req(pool: ServicePool, method: str, path: str, **kwargs) -> requests.Response:
+    # identical concurrent buffered GETs share one upstream call; its response is read-only for the callers
+    if method == 'GET' and kwargs.keys() <= {'params'}:
+        key = (pool.name, path, params_key(kwargs.get('params')))
+        res = SINGLE_FLIGHT.do(key, with_retries, pool, RETRY_ERRORS, method, path, **kwargs)
+    else:
+        res = with_retries(pool, RETRY_ERRORS, method, path, **kwargs)
     if res.status_code >= status.HTTP_500_INTERNAL_SERVER_ERROR:
+        res.close()
         res.raise_for_status()
     return res
 
 
+@stale_while_revalidate(STALE_CACHE)
+@bulkhead(Bulkhead('session'))
 @circuit
 def session_request(method: str, path: str, **kwargs) -> requests.Response:
-    return req(method, f'{ServiceUrl.SESSION}{path}', **kwargs)
+    return req(SESSION_POOL, method, path, **kwargs)
 
 
+@stale_while_revalidate(STALE_CACHE)
+@bulkhead(Bulkhead('publication'))
 @circuit
 def publication_request(method: str, path: str, **kwargs) -> requests.Response:
-    return req(method, f'{ServiceUrl.PUBLICATION}{path}', **kwargs)
+    return req(PUBLICATION_POOL, method, path, **kwargs)
 
 
+@stale_while_revalidate(STALE_CACHE)
+@bulkhead(Bulkhead('subscription'))
 @circuit
 def subscription_request(method: str, path: str, **kwargs) -> requests.Response:
-    return req(method, f'{ServiceUrl.SUBSCRIPTION}{path}', **kwargs)
+    return req(SUBSCRIPTION_POOL, method, path, **kwargs)
 
 
+@stale_while_revalidate(STALE_CACHE)
+@bulkhead(Bulkhead('statistics'))
 @circuit
 def statistics_request(method: str, path: str, **kwargs) -> requests.Response:
-    return req(method, f'{ServiceUrl.STATISTICS}{path}', **kwargs)
+    return req(STATISTICS_POOL, method, path, **kwargs)
+
 
+SERVICE_REQUESTS = {
+    'session': session_request,
+    'publication': publication_request,
+    'subscription': subscription_request,
+    'statistics': statistics_request,
+}
 
-def circuit_redirect(request: Request, func_request, path: str):
-    return func_request(request.method, path, params=request.query_params, data=request.data)
+SPOOL_PATH = os.getenv('BLOG_GATEWAY_SPOOL_PATH', str(Path(__file__).resolve().parent.parent / 'spool.sqlite3'))
+SPOOL_SIZE = int(os.getenv('BLOG_GATEWAY_SPOOL_SIZE', '10000'))
+SPOOL_MAX_ATTEMPTS = int(os.getenv('BLOG_GATEWAY_SPOOL_MAX_ATTEMPTS', '12'))
+SPOOL_BACKOFF = float(os.getenv('BLOG_GATEWAY_SPOOL_BACKOFF', '1'))
+SPOOL_MAX_BACKOFF = float(os.getenv('BLOG_GATEWAY_SPOOL_MAX_BACKOFF', '300'))
+SPOOL = Spool(SPOOL_PATH, SPOOL_SIZE, SPOOL_MAX_ATTEMPTS, SPOOL_BACKOFF, SPOOL_MAX_BACKOFF)
+
+JOB_WORKERS = int(os.getenv('BLOG_GATEWAY_JOB_WORKERS', '2'))
+JOB_DEADLINE = float(os.getenv('BLOG_GATEWAY_JOB_DEADLINE', '10'))
+JOBS = JobExecutor(SPOOL, SERVICE_REQUESTS, JOB_WORKERS, JOB_DEADLINE)
+JOBS.start()
+
+
+def post_statistics(batch: list[dict]):
+    JOBS.submit('statistics', 'POST', '/api/v1/statistics/bulk/', batch)
+
+
+STATISTICS_BATCH_SIZE = int(os.getenv('BLOG_GATEWAY_STATISTICS_BATCH_SIZE', '500'))
+STATISTICS_FLUSH_INTERVAL = int(os.getenv('BLOG_GATEWAY_STATISTICS_FLUSH_INTERVAL_MS', '1000')) / 1000
+STATISTICS_BUFFER = BatchBuffer(post_statistics, STATISTICS_BATCH_SIZE, STATISTICS_FLUSH_INTERVAL)
+
+
+def is_uuid(value) -> bool:
+    try:
+        uuid.UUID(str(value))
+    except ValueError:
+        return False
+    return True
+
+
+def record_view(publication_uid: str, viewer_uid: str | None):
+    stat = {'id': str(uuid.uuid4()), 'publication_uid': publication_uid}
+    if viewer_uid:
+        stat['viewer_uid'] = viewer_uid
+    # a malformed event would make the statistics service reject the whole batch
+    if not viewer_uid or is_uuid(viewer_uid):
+        STATISTICS_BUFFER.add(stat)
+
+
+# The body is relayed as the client sent it; only views that inspect the payload parse it and pass json= instead.
+def circuit_redirect(request: Request, func_request, path: str, **kwargs):
+    if 'json' not in kwargs:
+        kwargs['data'] = request.body
+        if content_type := request.META.get('CONTENT_TYPE'):
+            kwargs['headers'] = {**kwargs.get('headers', {}), 'Content-Type': content_type}
+    return func_request(request.method, path, params=request.query_params, **kwargs)
 
 
 def make_response(res: requests.Response) -> HttpResponse:
-    return HttpResponse(content=res.content, status=res.status_code, content_type=res.headers.get('content-type'))
+    response = HttpResponse(content=res.content, status=res.status_code, content_type=res.headers.get('content-type'))
+    for header in ('ETag', 'Age', 'Warning'):
+        if value := res.headers.get(header):
+            response[header] = value
+    return response
+
 
+def make_streaming_response(res: requests.Response) -> StreamingHttpResponse:
+    def stream():
+        try:
+            yield from res.iter_content(STREAM_CHUNK_SIZE)
+        finally:
+            res.close()
 
-def unavailable(service_name, error: requests.HTTPError | CircuitBreakerError):
-    if isinstance(error, CircuitBreakerError):
+    response = StreamingHttpResponse(stream(), status=res.status_code, content_type=res.headers.get('content-type'))
+    if content_length := res.headers.get('content-length'):
+        response['Content-Length'] = content_length
+    if etag := res.headers.get('etag'):
+        response['ETag'] = etag
+    return response
+
+
+def unavailable(service_name, error: requests.RequestException | CircuitOpenError):
+    if isinstance(error, BulkheadFull):
+        return HttpResponse(
+            content=f'{service_name} service is overloaded: {error}'.encode(),
+            status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        )
+    if isinstance(error, requests.Timeout):
+        return HttpResponse(
+            content=f'{service_name} service did not answer in time'.encode(),
+            status=status.HTTP_504_GATEWAY_TIMEOUT,
+        )
+    if isinstance(error, CircuitOpenError):
         return HttpResponse(
             content=f'{service_name} service is unavailable [circuit break]: {error}'.encode(),
             status=status.HTTP_503_SERVICE_UNAVAILABLE,
@@ -101,11 +207,17 @@ def unavailable(service_name, error: requests.HTTPError | CircuitBreakerError):
         )
 
 
-def raw_try_except_circuit_redirect(request: Request, service_name: str, circuit_request, path):
+# Pass-through responses are relayed chunk by chunk instead of being buffered in the gateway.
+# identity encoding keeps the upstream Content-Length valid for the bytes we forward.
+def raw_try_except_circuit_redirect(request: Request, service_name: str, circuit_request, path, **kwargs):
+    headers = {'Accept-Encoding': 'identity'}
+    if request.method == 'GET' and (if_none_match := request.headers.get('If-None-Match')):
+        headers['If-None-Match'] = if_none_match
     try:
-        return make_response(circuit_redirect(request, circuit_request, path))
-    except (requests.HTTPError, CircuitBreakerError) as e:
+        res = circuit_redirect(request, circuit_request, path, stream=True, headers=headers, **kwargs)
+    except (requests.RequestException, CircuitOpenError) as e:
         return unavailable(service_name, e)
+    return make_streaming_response(res)
 
 
 def circuit_api_view_redirect(http_method_names: list[str], service_name, circuit_request, path):
@@ -116,9 +228,25 @@ def circuit_api_view_redirect(http_method_names: list[str], service_name, circui
     return try_except_circuit_redirect
 
 
+@api_view(['GET'])
+def metrics(request: Request) -> HttpResponse:
+    return HttpResponse(content=json.dumps({
+        'pools': {pool.name: pool.stats.as_dict() for pool in POOLS},
+        'user_cache': USER_CACHE.stats(),
+        'representation_cache': REPRESENTATION_CACHE.stats(),
+        'single_flight': SINGLE_FLIGHT.stats(),
+        'breakers': {breaker.name: breaker.stats() for breaker in BREAKERS.values()},
+        'retries': RETRY_BUDGET.stats(),
+        'bulkheads': {bulkhead.name: bulkhead.stats() for bulkhead in BULKHEADS},
+        'stale_cache': STALE_CACHE.stats() if STALE_CACHE is not None else None,
+        'jobs': JOBS.stats(),
+    }), content_type='application/json')
+
+
 # Session Service
 
 users = circuit_api_view_redirect(['GET', 'POST'], 'Session', session_request, '/api/v1/users/')
+users_bulk = circuit_api_view_redirect(['POST'], 'Session', session_request, '/api/v1/users/bulk/')
 user_by_token = circuit_api_view_redirect(['POST'], 'Session', session_request, '/api/v1/user-by-token/')
 
 
@@ -156,117 +284,164 @@ def tag_uid(request: Request, uid: uuid.UUID) -> HttpResponse:
     return raw_try_except_circuit_redirect(request, 'Publication', publication_request, f'/api/v1/tags_uid/{uid}/')
 
 
-def replace_user(item, uid_field, new_field) -> HttpResponse | None:
+def fetch_users(uids) -> dict | HttpResponse:
+    users = USER_CACHE.get_many(uids)
+    missing = set(uids) - users.keys()
+    if not missing:
+        return users
+
     try:
-        res = session_request('GET', f'/api/v1/users/{item[uid_field]}/')
-    except (requests.HTTPError, CircuitBreakerError) as e:
+        res = session_request('POST', '/api/v1/users/bulk/', json={'ids': list(missing)})
+    except (requests.RequestException, CircuitOpenError) as e:
+        # while the session service is down, recently expired profiles are better than no page at all
+        if len(stale := USER_CACHE.get_many(missing, stale=True)) == len(missing):
+            return users | stale
         return unavailable('Session', e)
     if res.status_code != status.HTTP_200_OK:
         return make_response(res)
-    item[new_field] = res.json()
-    del item[uid_field]
 
+    fetched = res.json()
+    USER_CACHE.set_many(fetched)
+    return users | fetched
 
-def replace_author(item) -> HttpResponse | None:
-    return replace_user(item, 'author_uid', 'author')
+
+def replace_users(items, uid_field, new_field, default=None, users=None) -> HttpResponse | None:
+    uids = {item[uid_field] for item in items if item[uid_field]}
+    if users is None:
+        users = fetch_users(uids) if uids else {}
+        if isinstance(users, HttpResponse):
+            return users
+    if not uids.issubset(users):
+        return HttpResponse(content=json.dumps({'detail': 'Not found.'}), status=status.HTTP_404_NOT_FOUND,
+                            content_type='application/json')
+    for item in items:
+        uid = item.pop(uid_field)
+        item[new_field] = users[uid] if uid else default
 
 
 def replace_authors(items) -> HttpResponse | None:
-    for item in items:
-        res = replace_author(item)
-        if res is not None:
-            return res
+    return replace_users(items, 'author_uid', 'author')
 
 
-def replace_tags(request: Request) -> HttpResponse | None:
-    _tags = request.data['tags'].split()
-    for _tag in _tags:
-        try:
-            res = publication_request('GET', f'/api/v1/tags/{_tag}/')
-        except (requests.HTTPError, CircuitBreakerError) as e:
-            return unavailable('Publication', e)
+# the publication service ensures the tags in bulk while saving the publication
+def replace_tags(request: Request):
+    request.data['tags'] = request.data['tags'].split()
+
+
+def is_large_page(request: Request) -> bool:
+    page_size = request.query_params.get('page_size', '')
+    return page_size.isdigit() and int(page_size) > STREAM_PAGE_SIZE
+
+
+def enrich_authors(items):
+    users = fetch_users({item['author_uid'] for item in items})
+    if isinstance(users, HttpResponse):
+        raise EnrichmentError(users)
+    err = replace_users(items, 'author_uid', 'author', users=users)
+    if err is not None:
+        raise EnrichmentError(err)
 
-        if res.status_code == status.HTTP_404_NOT_FOUND:
-            try:
-                res = publication_request('POST', '/api/v1/tags/', json={'name': _tag})
-            except (requests.HTTPError, CircuitBreakerError) as e:
-                return unavailable('Publication', e)
 
-            if res.status_code != status.HTTP_201_CREATED:
-                return make_response(res)
-    request.data['tags'] = _tags
+# Large pages are rewritten while they stream through, so the gateway never holds the whole page.
+# enrich_page holds its output until the first batch is resolved, so only a later failure can cut the stream short.
+def stream_publications(request: Request) -> HttpResponse:
+    try:
+        res = publication_request('GET', '/api/v1/publications/', params=request.query_params, stream=True)
+    except (requests.RequestException, CircuitOpenError) as e:
+        return unavailable('Publication', e)
+    if res.status_code != status.HTTP_200_OK:
+        return make_response(res)
+
+    body = enrich_page(res.iter_content(STREAM_CHUNK_SIZE), enrich_authors, ENRICH_BATCH_SIZE)
+    try:
+        first = next(body, b'')
+    except EnrichmentError as e:
+        res.close()
+        return e.response
+
+    def stream():
+        try:
+            yield first
+            yield from body
+        finally:
+            body.close()
+            res.close()
+
+    return StreamingHttpResponse(stream(), content_type='application/json')
 
 
 class Publications(APIView):
     @staticmethod
     def get(request: Request) -> HttpResponse:
+        if is_large_page(request):
+            return stream_publications(request)
+
         try:
             res = publication_request('GET', '/api/v1/publications/', params=request.query_params)
-        except (requests.HTTPError, CircuitBreakerError) as e:
+        except (requests.RequestException, CircuitOpenError) as e:
             return unavailable('Publication', e)
 
         if res.status_code != status.HTTP_200_OK:
             return make_response(res)
-        data = res.json()
-        err = replace_authors(data['items'])
-        if err is not None:
-            return err
 
-        return HttpResponse(content=json.dumps(data), content_type='application/json')
+        fingerprint = REPRESENTATION_CACHE.fingerprint(res)
+        if (representation := REPRESENTATION_CACHE.get(fingerprint)) is None:
+            data = res.json()
+            err = replace_authors(data['items'])
+            if err is not None:
+                return err
+            representation = REPRESENTATION_CACHE.put(fingerprint, json.dumps(data).encode())
+
+        return carry_staleness(conditional_response(request, *representation), res)
 
     @staticmethod
     def post(request: Request) -> HttpResponse:
-        err = replace_tags(request)
-        if err is not None:
-            return err
-        return raw_try_except_circuit_redirect(request, 'Publication', publication_request, '/api/v1/publications/')
+        replace_tags(request)
+        return raw_try_except_circuit_redirect(request, 'Publication', publication_request, '/api/v1/publications/',
+                                               json=request.data)
 
 
 class Publication(APIView):
     @staticmethod
     def get(request: Request, uid: uuid.UUID) -> HttpResponse:
+        publication = fan_out(publication_request, 'GET', f'/api/v1/publications/{uid}/',
+                              params=request.query_params)
+        comments_page = fan_out(publication_request, 'GET', f'/api/v1/comments/?publication={uid}',
+                                params=request.query_params)
+
         try:
-            res = publication_request('GET', f'/api/v1/publications/{uid}/', params=request.query_params)
-        except (requests.HTTPError, CircuitBreakerError) as e:
+            publication_res = publication.result()
+        except (requests.RequestException, CircuitOpenError) as e:
             return unavailable('Publication', e)
-        if res.status_code != status.HTTP_200_OK:
-            return make_response(res)
-
-        data = {'publication': res.json()}
-        err = replace_author(data['publication'])
-        if err is not None:
-            return err
+        if publication_res.status_code != status.HTTP_200_OK:
+            return make_response(publication_res)
 
         try:
-            res = publication_request('GET', f'/api/v1/comments/?publication={uid}', params=request.query_params)
-        except (requests.HTTPError, CircuitBreakerError) as e:
+            comments_res = comments_page.result()
+        except (requests.RequestException, CircuitOpenError) as e:
             return unavailable('Publication', e)
-        if res.status_code != status.HTTP_200_OK:
-            return make_response(res)
-
-        data.update(res.json())
-        err = replace_authors(data.get('items', []))
-        if err is not None:
-            return err
-
-        stat = {'publication_uid': data['publication']['id']}
-        if viewer_uid := request.query_params.get('viewer_uid'):
-            stat['viewer_uid'] = viewer_uid
+        if comments_res.status_code != status.HTTP_200_OK:
+            return make_response(comments_res)
+
+        fingerprint = REPRESENTATION_CACHE.fingerprint(publication_res, comments_res)
+        if (representation := REPRESENTATION_CACHE.get(fingerprint)) is None:
+            data = {'publication': publication_res.json()}
+            data.update(comments_res.json())
+            err = replace_authors([data['publication'], *data.get('items', [])])
+            if err is not None:
+                return err
+            representation = REPRESENTATION_CACHE.put(fingerprint, json.dumps(data).encode())
 
-        def post_stat():
-            statistics_request('POST', '/api/v1/statistics/', json=stat)
-        QUEUE.put(post_stat)
+        record_view(str(uid), request.query_params.get('viewer_uid'))
 
-        return HttpResponse(content=json.dumps(data), content_type='application/json')
+        return carry_staleness(conditional_response(request, *representation), publication_res, comments_res)
 
     @staticmethod
     def patch(request: Request, uid: uuid.UUID) -> HttpResponse:
         if 'tags' in request.data:
-            err = replace_tags(request)
-            if err is not None:
-                return err
+            replace_tags(request)
         return raw_try_except_circuit_redirect(request, 'Publication', publication_request,
-                                               f'/api/v1/publications/{uid}/')
+                                               f'/api/v1/publications/{uid}/', json=request.data)
 
     @staticmethod
     def delete(request: Request, uid: uuid.UUID) -> HttpResponse:
@@ -286,34 +461,152 @@ def comment(request: Request, uid: uuid.UUID) -> HttpResponse:
 
 @api_view(['GET'])
 def statistics(request: Request, uid: uuid.UUID) -> HttpResponse:
+    publication = fan_out(publication_request, 'GET', f'/api/v1/publications/{uid}/')
+    statistics_page = fan_out(statistics_request, 'GET', f'/api/v1/statistics/?publication_uid={uid}',
+                              params=request.query_params)
+
     try:
-        res = publication_request('GET', f'/api/v1/publications/{uid}/')
-    except (requests.HTTPError, CircuitBreakerError) as e:
+        publication_res = publication.result()
+    except (requests.RequestException, CircuitOpenError) as e:
         return unavailable('Publication', e)
-    if res.status_code != status.HTTP_200_OK:
-        return make_response(res)
-    data = {'publication': res.json()}
+    if publication_res.status_code != status.HTTP_200_OK:
+        return make_response(publication_res)
+    data = {'publication': publication_res.json()}
+
+    try:
+        statistics_res = statistics_page.result()
+    except (requests.RequestException, CircuitOpenError) as e:
+        return unavailable('Statistics', e)
+    if statistics_res.status_code != status.HTTP_200_OK:
+        return make_response(statistics_res)
+    data.update(statistics_res.json())
 
-    err = replace_author(data['publication'])
+    uids = {item['viewer_uid'] for item in data['items'] if item['viewer_uid']}
+    users = fetch_users(uids | {data['publication']['author_uid']})
+    if isinstance(users, HttpResponse):
+        return users
+
+    err = replace_users([data['publication']], 'author_uid', 'author', users=users)
+    if err is not None:
+        return err
+    err = replace_users(data['items'], 'viewer_uid', 'viewer', '%%guest%%', users=users)
     if err is not None:
         return err
 
+    response = HttpResponse(content=json.dumps(data), content_type='application/json')
+    return carry_staleness(response, publication_res, statistics_res)
+
+
+# Composite pages: everything a frontend page needs, fetched concurrently in one round trip
+
+def authenticate(request: Request):
+    authorization = request.headers.get('Authorization', '')
+    if not authorization.startswith('Bearer '):
+        return None
+    token = authorization.removeprefix('Bearer ')
+    return fan_out(session_request, 'POST', '/api/v1/user-by-token/', json={'token': token})
+
+
+def auth_user_result(auth) -> dict:
+    if auth is not None:
+        try:
+            res = auth.result()
+        except (requests.RequestException, CircuitOpenError):
+            res = None
+        if res is not None and res.status_code == status.HTTP_200_OK:
+            return {'is_authenticated': True, **res.json()}
+    return {'is_authenticated': False}
+
+
+def check_subscribed(auth_user: dict, following_uid: str):
+    if not auth_user['is_authenticated'] or auth_user['id'] == following_uid:
+        return None
+    return fan_out(subscription_request, 'GET', '/api/v1/subscriptions/',
+                   params={'follower_uid': auth_user['id'], 'following_uid': following_uid})
+
+
+def subscribed_result(subscription) -> bool | None:
+    if subscription is None:
+        return None
     try:
-        res = statistics_request('GET', f'/api/v1/statistics/?publication_uid={uid}', params=request.query_params)
-    except (requests.HTTPError, CircuitBreakerError) as e:
-        return unavailable('Statistics', e)
+        res = subscription.result()
+    except (requests.RequestException, CircuitOpenError):
+        return None
+    return len(res.json()) > 0 if res.status_code == status.HTTP_200_OK else None
+
+
+def publications_page(publications) -> dict | HttpResponse:
+    try:
+        res = publications.result()
+    except (requests.RequestException, CircuitOpenError) as e:
+        return unavailable('Publication', e)
     if res.status_code != status.HTTP_200_OK:
         return make_response(res)
+    data = res.json()
+    err = replace_authors(data['items'])
+    return data if err is None else err
 
-    data.update(res.json())
 
-    for item in data['items']:
-        if item['viewer_uid']:
-            err = replace_user(item, 'viewer_uid', 'viewer')
-            if err is not None:
-                return err
-        else:
-            item['viewer'] = '%%guest%%'
-            del item['viewer_uid']
+@api_view(['GET'])
+def user_page(request: Request, username: str) -> HttpResponse:
+    auth = authenticate(request)
+    try:
+        res = session_request('GET', '/api/v1/users/', params={'username': username})
+    except (requests.RequestException, CircuitOpenError) as e:
+        return unavailable('Session', e)
+    if res.status_code != status.HTTP_200_OK:
+        return make_response(res)
+    # other 404s of this page come from the publication service, so a missing user is marked in the body
+    if not (users := res.json()):
+        return HttpResponse(content=json.dumps({'detail': 'Not found.', 'user': None}),
+                            status=status.HTTP_404_NOT_FOUND, content_type='application/json')
+    user = users[0]
+
+    params = request.query_params.copy()
+    params['author_uid'] = user['id']
+    publications = fan_out(publication_request, 'GET', '/api/v1/publications/', params=params)
+    auth_user = auth_user_result(auth)
+    subscription = check_subscribed(auth_user, user['id'])
+
+    page = publications_page(publications)
+    if isinstance(page, HttpResponse):
+        return page
+
+    response = HttpResponse(content=json.dumps({
+        'auth_user': auth_user,
+        'user': user,
+        'subscribed': subscribed_result(subscription),
+        'publications': page,
+    }), content_type='application/json')
+    return carry_staleness(response, res, publications.result())
+
+
+@api_view(['GET'])
+def tag_page(request: Request, name: str) -> HttpResponse:
+    auth = authenticate(request)
+    tag = fan_out(publication_request, 'GET', f'/api/v1/tags/{name}/')
+    params = request.query_params.copy()
+    params['tags__name'] = name
+    publications = fan_out(publication_request, 'GET', '/api/v1/publications/', params=params)
+    auth_user = auth_user_result(auth)
 
-    return HttpResponse(content=json.dumps(data), content_type='application/json')
+    try:
+        res = tag.result()
+    except (requests.RequestException, CircuitOpenError) as e:
+        return unavailable('Publication', e)
+    if res.status_code not in (status.HTTP_200_OK, status.HTTP_404_NOT_FOUND):
+        return make_response(res)
+    tag = res.json() if res.status_code == status.HTTP_200_OK else None
+    subscription = check_subscribed(auth_user, tag['id']) if tag is not None else None
+
+    page = publications_page(publications)
+    if isinstance(page, HttpResponse):
+        return page
+
+    response = HttpResponse(content=json.dumps({
+        'auth_user': auth_user,
+        'tag': tag,
+        'subscribed': subscribed_result(subscription),
+        'publications': page,
+    }), content_type='application/json')
+    return carry_staleness(response, res, publications.result())
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from publication_service.search import rebuild_search_index, search_index_available
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the publication full-text search index from the publications table'
+
+    def handle(self, *args, **options):
+        if not search_index_available():
+            raise CommandError('This database has no full-text search index')
+        rebuild_search_index()
+        self.stdout.write('Search index rebuilt')
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from publication_service.models import Publication, Comment
+from publication_service.rating import recount_ratings
+
+
+class Command(BaseCommand):
+    help = 'Recomputes publication and comment ratings from their votes'
+
+    def handle(self, *args, **options):
+        for model in (Publication, Comment):
+            self.stdout.write(f'{model.__name__}: {recount_ratings(model)} ratings recomputed')
@@ -0,0 +1,43 @@
+# Generated by Django 4.0.6 on 2026-10-18 11:41
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+# Concurrent votes could store the same user's vote twice and count it twice in the rating,
+# so duplicates are dropped and the ratings of the objects they touched are recounted.
+def remove_duplicate_votes(apps, schema_editor):
+    Vote = apps.get_model('publication_service', 'Vote')
+    seen = set()
+    touched = set()
+    for vote in Vote.objects.order_by('id').iterator():
+        key = (vote.user_uid, vote.content_type_id, vote.object_id)
+        if key in seen:
+            vote.delete()
+            touched.add((vote.content_type_id, vote.object_id))
+        else:
+            seen.add(key)
+
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    for content_type_id, object_id in touched:
+        content_type = ContentType.objects.get(id=content_type_id)
+        model = apps.get_model(content_type.app_label, content_type.model)
+        rating = Vote.objects.filter(content_type_id=content_type_id, object_id=object_id).aggregate(
+            rating=Sum('value'))['rating'] or 0
+        model.objects.filter(id=object_id).update(rating=rating)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('publication_service', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_votes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='vote',
+            constraint=models.UniqueConstraint(fields=('user_uid', 'content_type', 'object_id'), name='unique_vote'),
+        ),
+    ]
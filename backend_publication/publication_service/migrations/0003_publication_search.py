@@ -0,0 +1,53 @@
+from django.db import migrations
+
+
+TABLE = 'publication_service_publication'
+SEARCH_TABLE = 'publication_service_publication_search'
+
+# An external-content FTS5 index: it stores only the index and reads title and body back from the
+# publication table by rowid, kept in sync by triggers.
+CREATE = [
+    f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5("
+    f"title, body, content='{TABLE}', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2')",
+    f"CREATE TRIGGER {SEARCH_TABLE}_insert AFTER INSERT ON {TABLE} BEGIN "
+    f"INSERT INTO {SEARCH_TABLE}(rowid, title, body) VALUES (new.rowid, new.title, new.body); END",
+    f"CREATE TRIGGER {SEARCH_TABLE}_delete AFTER DELETE ON {TABLE} BEGIN "
+    f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, title, body) "
+    f"VALUES ('delete', old.rowid, old.title, old.body); END",
+    f"CREATE TRIGGER {SEARCH_TABLE}_update AFTER UPDATE OF title, body ON {TABLE} BEGIN "
+    f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, title, body) "
+    f"VALUES ('delete', old.rowid, old.title, old.body); "
+    f"INSERT INTO {SEARCH_TABLE}(rowid, title, body) VALUES (new.rowid, new.title, new.body); END",
+    f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')",
+]
+
+DROP = [
+    f'DROP TRIGGER IF EXISTS {SEARCH_TABLE}_insert',
+    f'DROP TRIGGER IF EXISTS {SEARCH_TABLE}_delete',
+    f'DROP TRIGGER IF EXISTS {SEARCH_TABLE}_update',
+    f'DROP TABLE IF EXISTS {SEARCH_TABLE}',
+]
+
+
+# other databases keep searching with SearchFilter
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for sql in CREATE:
+            schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for sql in DROP:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('publication_service', '0002_vote_unique'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
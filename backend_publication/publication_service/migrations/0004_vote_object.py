@@ -0,0 +1,17 @@
+# Generated by Django 4.0.6 on 2026-10-18 12:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('publication_service', '0003_publication_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='vote',
+            index=models.Index(fields=['content_type', 'object_id'], name='vote_object'),
+        ),
+    ]
@@ -4,11 +4,28 @@ from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelatio
 from django.contrib.contenttypes.models import ContentType
 from django.db import models
 
+from .count import bump_count_version
+
+
+class TagManager(models.Manager):
+    def ensure(self, names) -> list['Tag']:
+        names = list(dict.fromkeys(names))
+        tags = {tag.name: tag for tag in self.filter(name__in=names)}
+        missing = [name for name in names if name not in tags]
+        if missing:
+            # a concurrent writer may create the same tags, so the ids are read back instead of trusted
+            self.bulk_create([self.model(name=name) for name in missing], ignore_conflicts=True)
+            bump_count_version(self.model)
+            tags.update((tag.name, tag) for tag in self.filter(name__in=missing))
+        return [tags[name] for name in names]
+
 
 class Tag(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.SlugField(unique=True)
 
+    objects = TagManager()
+
 
 class Vote(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -24,6 +41,15 @@ class Vote(models.Model):
     object_id = models.UUIDField(editable=False)
     content_object = GenericForeignKey('content_type', 'object_id')
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user_uid', 'content_type', 'object_id'], name='unique_vote'),
+        ]
+        # ratings are recounted per object, and the unique constraint's index starts with user_uid
+        indexes = [
+            models.Index(fields=['content_type', 'object_id'], name='vote_object'),
+        ]
+
 
 class Publication(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -47,3 +73,8 @@ class Comment(models.Model):
     pub_date = models.DateTimeField('date published', auto_now_add=True)
     rating = models.SmallIntegerField(default=0)
     votes = GenericRelation(Vote)
+
+
+class CountVersion(models.Model):
+    label = models.CharField(primary_key=True, max_length=100)
+    version = models.BigIntegerField(default=0)
@@ -0,0 +1,76 @@
+import os
+import threading
+import time
+
+from collections import defaultdict
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import DatabaseError, transaction
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Vote
+
+
+RATING_WRITE_BEHIND = os.getenv('BLOG_PUBLICATION_RATING_WRITE_BEHIND', '0') == '1'
+RATING_FLUSH_INTERVAL = float(os.getenv('BLOG_PUBLICATION_RATING_FLUSH_INTERVAL', '1'))
+RATING_FLUSH_CHUNK = 200
+
+
+# Write-behind ratings: votes are stored right away, but the objects they touch are only marked dirty in memory,
+# and once per flush interval the dirty ratings are recomputed from their votes in bulk, so a burst of votes on one
+# object costs a single row update. Recomputing instead of adding deltas keeps a flush idempotent and correct after
+# `manage.py reconcile_ratings`; the deltas are kept only to report a fresh rating before the next flush.
+# Objects still dirty when the process dies keep a stale rating until reconcile_ratings recounts them.
+class RatingBuffer:
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.deltas = defaultdict(int)
+        self.flushing = {}
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def add(self, model, object_id, delta: int):
+        with self.lock:
+            self.deltas[(model, object_id)] += delta
+
+    def pending(self, model, object_id) -> int:
+        key = (model, object_id)
+        with self.lock:
+            return self.deltas.get(key, 0) + self.flushing.get(key, 0)
+
+    def flush(self):
+        with self.lock:
+            self.flushing, self.deltas = self.deltas, defaultdict(int)
+        models = defaultdict(list)
+        for model, object_id in self.flushing:
+            models[model].append(object_id)
+
+        try:
+            with transaction.atomic():
+                for model, ids in models.items():
+                    for i in range(0, len(ids), RATING_FLUSH_CHUNK):
+                        recount_ratings(model, ids[i:i + RATING_FLUSH_CHUNK])
+        except DatabaseError as e:
+            print(f'rating flush failed, retrying next interval: {e}')
+            with self.lock:
+                for key, delta in self.flushing.items():
+                    self.deltas[key] += delta
+        finally:
+            with self.lock:
+                self.flushing = {}
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+
+RATING_BUFFER = RatingBuffer(RATING_FLUSH_INTERVAL) if RATING_WRITE_BEHIND else None
+
+
+def recount_ratings(model, ids=None) -> int:
+    votes = Vote.objects.filter(content_type=ContentType.objects.get_for_model(model), object_id=OuterRef('id'))
+    total = votes.order_by().values('object_id').annotate(total=Sum('value')).values('total')
+    objects = model.objects.all() if ids is None else model.objects.filter(id__in=ids)
+    return objects.update(rating=Coalesce(Subquery(total), 0))
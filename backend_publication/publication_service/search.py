@@ -0,0 +1,123 @@
+import html
+import re
+
+from django.db import connection
+from rest_framework import filters
+from rest_framework.settings import api_settings
+
+
+TABLE = 'publication_service_publication'
+SEARCH_TABLE = 'publication_service_publication_search'
+SNIPPET_TOKENS = 16
+
+# snippet() marks matches with control characters, so the text around them can be HTML-escaped safely
+MATCH_START = '\x02'
+MATCH_END = '\x03'
+
+TERM = re.compile(r'\w+', re.UNICODE)
+
+
+# looked up once per database file, since the index only appears with a migration
+SEARCH_INDEX_AVAILABLE = {}
+
+
+def search_index_available() -> bool:
+    if connection.vendor != 'sqlite':
+        return False
+    name = connection.settings_dict['NAME']
+    if name not in SEARCH_INDEX_AVAILABLE:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [SEARCH_TABLE])
+            SEARCH_INDEX_AVAILABLE[name] = cursor.fetchone() is not None
+    return SEARCH_INDEX_AVAILABLE[name]
+
+
+# Every search term becomes a quoted FTS5 phrase, so user input cannot inject query syntax;
+# a term ending in * stays a prefix query.
+def fts_query(terms: list[str]) -> str:
+    phrases = []
+    for term in terms:
+        words = TERM.findall(term)
+        if words:
+            phrases.append('"' + ' '.join(words) + '"' + ('*' if term.endswith('*') else ''))
+    return ' '.join(phrases)
+
+
+def highlight(snippet: str) -> str:
+    return html.escape(snippet).replace(MATCH_START, '<mark>').replace(MATCH_END, '</mark>')
+
+
+# the same triggers as migration 0003, which keep the external-content index in sync with the publication table
+TRIGGERS = {
+    f'{SEARCH_TABLE}_insert':
+        f"AFTER INSERT ON {TABLE} BEGIN "
+        f"INSERT INTO {SEARCH_TABLE}(rowid, title, body) VALUES (new.rowid, new.title, new.body); END",
+    f'{SEARCH_TABLE}_delete':
+        f"AFTER DELETE ON {TABLE} BEGIN "
+        f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, title, body) "
+        f"VALUES ('delete', old.rowid, old.title, old.body); END",
+    f'{SEARCH_TABLE}_update':
+        f"AFTER UPDATE OF title, body ON {TABLE} BEGIN "
+        f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, title, body) "
+        f"VALUES ('delete', old.rowid, old.title, old.body); "
+        f"INSERT INTO {SEARCH_TABLE}(rowid, title, body) VALUES (new.rowid, new.title, new.body); END",
+}
+
+
+def missing_search_triggers() -> set[str]:
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = %s", [TABLE])
+        return TRIGGERS.keys() - {row[0] for row in cursor.fetchall()}
+
+
+# A migration that remakes the publication table drops its triggers, and a remake or a VACUUM may renumber
+# its rowids, so the triggers are recreated before the index is reloaded from the table.
+def rebuild_search_index():
+    with connection.cursor() as cursor:
+        for name in missing_search_triggers():
+            cursor.execute(f'CREATE TRIGGER {name} {TRIGGERS[name]}')
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')")
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('optimize')")
+
+
+# runs after every migrate, so a migration that remade the publication table cannot leave the index stale
+def repair_search_index(**kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [SEARCH_TABLE])
+        if cursor.fetchone() is None:
+            return
+    if missing_search_triggers():
+        print('publication search triggers are missing, rebuilding the search index')
+        rebuild_search_index()
+
+
+# Searches the FTS5 index over title and body, ranked by bm25 unless the request asks for an ordering,
+# and annotates each publication with a highlighted snippet of its body.
+# Falls back to SearchFilter's LIKE scan on databases without the index.
+class FullTextSearchFilter(filters.SearchFilter):
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        if not search_index_available():
+            return super().filter_queryset(request, queryset, view)
+        query = fts_query(terms)
+        if not query:
+            return queryset
+
+        table = queryset.model._meta.db_table
+        queryset = queryset.extra(
+            tables=[SEARCH_TABLE],
+            where=[f'{SEARCH_TABLE}.rowid = {table}.rowid', f'{SEARCH_TABLE} MATCH %s'],
+            params=[query],
+            select={
+                'search_rank': f'bm25({SEARCH_TABLE})',
+                'search_snippet':
+                    f"snippet({SEARCH_TABLE}, 1, '{MATCH_START}', '{MATCH_END}', '…', {SNIPPET_TOKENS})",
+            },
+        )
+        if request.query_params.get(api_settings.ORDERING_PARAM):
+            return queryset
+        return queryset.order_by('search_rank')
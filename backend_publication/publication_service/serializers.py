@@ -1,6 +1,7 @@
 from rest_framework import serializers
 
 from .models import Tag, Vote, Publication, Comment
+from .search import highlight
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -9,6 +10,13 @@ class TagSerializer(serializers.ModelSerializer):
         fields = serializers.ALL_FIELDS
 
 
+class TagNamesField(serializers.ListField):
+    child = serializers.SlugField()
+
+    def to_representation(self, data):
+        return [tag.name for tag in data.all()]
+
+
 class VoteSerializer(serializers.ModelSerializer):
     class Meta:
         model = Vote
@@ -16,13 +24,29 @@ class VoteSerializer(serializers.ModelSerializer):
 
 
 class PublicationSerializer(serializers.ModelSerializer):
-    tags = serializers.SlugRelatedField(slug_field='name', many=True, queryset=Tag.objects.all())
+    tags = TagNamesField()
     author_uid = serializers.UUIDField()
 
     class Meta:
         model = Publication
         fields = serializers.ALL_FIELDS
 
+    def create(self, validated_data):
+        validated_data['tags'] = Tag.objects.ensure(validated_data['tags'])
+        return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        if 'tags' in validated_data:
+            validated_data['tags'] = Tag.objects.ensure(validated_data['tags'])
+        return super().update(instance, validated_data)
+
+    # full-text search results carry a snippet of the body with the matches highlighted
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if getattr(instance, 'search_snippet', None) is not None:
+            data['snippet'] = highlight(instance.search_snippet)
+        return data
+
 
 class CommentSerializer(serializers.ModelSerializer):
     author_uid = serializers.UUIDField()
@@ -1,3 +1,229 @@
-from django.test import TestCase
+import base64
+import io
+import json
+import threading
+import uuid
 
-# Create your tests here.
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.core.management.sql import emit_post_migrate_signal
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient, APITestCase
+
+from .models import CountVersion, Tag, Vote, Publication
+from .rating import RatingBuffer, recount_ratings
+from .search import missing_search_triggers
+
+
+def create_publication() -> Publication:
+    return Publication.objects.create(author_uid=uuid.uuid4(), title='title', body='body')
+
+
+class TagTest(APITestCase):
+    def test_tag_named_like_a_route(self):
+        Tag.objects.create(name='ensure')
+        res = self.client.get('/api/v1/tags/ensure/')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()['name'], 'ensure')
+
+    def test_publication_creates_its_tags(self):
+        Tag.objects.create(name='django')
+        res = self.client.post('/api/v1/publications/', {
+            'author_uid': str(uuid.uuid4()), 'title': 'title', 'body': 'body', 'tags': ['django', 'sqlite', 'sqlite'],
+        }, format='json')
+        self.assertEqual(res.status_code, 201, res.content)
+        self.assertEqual(sorted(res.json()['tags']), ['django', 'sqlite'])
+        self.assertEqual(Tag.objects.count(), 2)
+
+
+class CountCacheTest(APITestCase):
+    def count(self) -> int:
+        return self.client.get('/api/v1/publications/', {'page_size': 1}).json()['items_count']
+
+    def test_write_in_another_process_invalidates_the_count(self):
+        create_publication()
+        self.assertEqual(self.count(), 1)
+
+        # another worker writes without this process seeing a signal, and bumps the version in the database
+        Publication.objects.bulk_create([Publication(author_uid=uuid.uuid4(), title='title', body='body')])
+        self.assertEqual(self.count(), 1)
+        CountVersion.objects.filter(label='publication_service.publication').update(version=F('version') + 1)
+        self.assertEqual(self.count(), 2)
+
+
+class CursorPaginationTest(APITestCase):
+    def setUp(self):
+        for _ in range(7):
+            create_publication()
+        self.ids = [str(publication.id) for publication in Publication.objects.order_by('-pub_date', '-id')]
+
+    def page(self, cursor: str) -> dict:
+        res = self.client.get('/api/v1/publications/', {'cursor': cursor, 'page_size': 3})
+        self.assertEqual(res.status_code, 200)
+        return res.json()
+
+    def test_forward_and_backward(self):
+        pages, cursor = [], ''
+        while cursor is not None:
+            pages.append(page := self.page(cursor))
+            cursor = page['next_cursor']
+        self.assertEqual([item['id'] for page in pages for item in page['items']], self.ids)
+        self.assertEqual([len(page['items']) for page in pages], [3, 3, 1])
+        self.assertIsNone(pages[0]['previous_cursor'])
+
+        previous = self.page(pages[2]['previous_cursor'])
+        self.assertEqual([item['id'] for item in previous['items']], self.ids[3:6])
+        previous = self.page(previous['previous_cursor'])
+        self.assertEqual([item['id'] for item in previous['items']], self.ids[:3])
+        self.assertIsNone(previous['previous_cursor'])
+        self.assertIsNotNone(previous['next_cursor'])
+
+    def test_malformed_cursor(self):
+        def encode(value) -> str:
+            return base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+        for cursor in ('W1siYSIsImIiXSwgZmFsc2Vd', 'not base64!', encode([['2022-01-01T00:00:00+00:00'], False]),
+                       encode([['2022-01-01T00:00:00+00:00', 'not-a-uuid'], False]), encode([[1, 2], True]),
+                       encode({'a': 1}), encode('x')):
+            with self.subTest(cursor=cursor):
+                res = self.client.get('/api/v1/publications/', {'cursor': cursor, 'page_size': 3})
+                self.assertEqual(res.status_code, 404)
+
+
+class SearchTest(APITestCase):
+    def test_search(self):
+        create_publication()
+        match = Publication.objects.create(author_uid=uuid.uuid4(), title='Keyset pagination', body='cursor paging')
+        res = self.client.get('/api/v1/publications/', {'search': 'keyset', 'page_size': 10})
+        self.assertEqual([item['id'] for item in res.json()['items']], [str(match.id)])
+
+    def test_listing_without_search_skips_the_index_lookup(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/v1/publications/')
+        self.assertFalse([query for query in queries if 'sqlite_master' in query['sql']])
+
+
+class SearchIndexRemakeTest(TransactionTestCase):
+    def remake(self):
+        with connection.schema_editor() as editor:
+            editor._remake_table(Publication)
+        self.assertTrue(missing_search_triggers())
+
+    def search(self, query: str) -> list[str]:
+        res = self.client.get('/api/v1/publications/', {'search': query, 'page_size': 10})
+        return [item['id'] for item in res.json()['items']]
+
+    def test_rebuild_recreates_the_triggers(self):
+        old = Publication.objects.create(author_uid=uuid.uuid4(), title='Remade table', body='body')
+        self.remake()
+        call_command('rebuild_search_index', stdout=io.StringIO())
+
+        new = Publication.objects.create(author_uid=uuid.uuid4(), title='Remade again', body='body')
+        self.assertEqual(sorted(self.search('remade')), sorted([str(old.id), str(new.id)]))
+
+    def test_migrate_repairs_the_index(self):
+        self.remake()
+        emit_post_migrate_signal(verbosity=0, interactive=False, db='default')
+        self.assertFalse(missing_search_triggers())
+
+        match = Publication.objects.create(author_uid=uuid.uuid4(), title='Migrated', body='body')
+        self.assertEqual(self.search('migrated'), [str(match.id)])
+
+
+class VoteTest(APITestCase):
+    def setUp(self):
+        self.publication = create_publication()
+        self.user_uid = str(uuid.uuid4())
+
+    def vote(self, value: int, object_id=None, user_uid=None):
+        return self.client.post('/api/v1/vote/', {
+            'content_type': 'publication',
+            'user_uid': user_uid or self.user_uid,
+            'object_id': str(object_id or self.publication.id),
+            'value': value,
+        }, format='json')
+
+    def test_vote(self):
+        res = self.vote(1)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json(), {'rating': 1})
+        self.assertEqual(Vote.objects.get().value, 1)
+
+    def test_repeated_vote_is_taken_back(self):
+        self.vote(-1)
+        self.assertEqual(self.vote(-1).json(), {'rating': 0})
+        self.assertFalse(Vote.objects.exists())
+
+    def test_flipped_vote(self):
+        self.vote(1)
+        self.assertEqual(self.vote(-1).json(), {'rating': -1})
+        self.assertEqual(Vote.objects.get().value, -1)
+
+    def test_votes_of_different_users_add_up(self):
+        for _ in range(3):
+            self.vote(1, user_uid=str(uuid.uuid4()))
+        self.publication.refresh_from_db()
+        self.assertEqual(self.publication.rating, 3)
+
+    def test_missing_object(self):
+        self.assertEqual(self.vote(1, object_id=uuid.uuid4()).status_code, 404)
+        self.assertFalse(Vote.objects.exists())
+
+    def test_first_vote_is_two_statements(self):
+        ContentType.objects.get_for_model(Publication)
+        with CaptureQueriesContext(connection) as queries:
+            self.vote(1)
+        statements = [query['sql'] for query in queries if not query['sql'].startswith(('SAVEPOINT', 'RELEASE'))]
+        self.assertEqual(len(statements), 2, statements)
+
+
+class VoteContentionTest(TransactionTestCase):
+    def test_concurrent_votes(self):
+        publication = create_publication()
+        users = [str(uuid.uuid4()) for _ in range(40)]
+        errors = []
+
+        def vote(user_uids):
+            client = APIClient()
+            try:
+                for user_uid in user_uids:
+                    res = client.post('/api/v1/vote/', {'content_type': 'publication', 'user_uid': user_uid,
+                                                        'object_id': str(publication.id), 'value': 1}, format='json')
+                    if res.status_code != 200:
+                        errors.append(res.status_code)
+            finally:
+                connection.close()
+
+        # every user votes twice (the second vote takes the first back), except the first ten
+        batches = [users[i::4] + users[10:][i::4] for i in range(4)]
+        threads = [threading.Thread(target=vote, args=(batch,)) for batch in batches]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        publication.refresh_from_db()
+        self.assertEqual(publication.rating, 10)
+        self.assertEqual(Vote.objects.count(), 10)
+
+
+class RatingBufferTest(TestCase):
+    def test_flush_after_reconcile(self):
+        publication = create_publication()
+        content_type = ContentType.objects.get_for_model(Publication)
+        buffer = RatingBuffer(3600)
+        for _ in range(3):
+            Vote.objects.create(user_uid=uuid.uuid4(), content_type=content_type, object_id=publication.id, value=1)
+            buffer.add(Publication, publication.id, 1)
+        self.assertEqual(buffer.pending(Publication, publication.id), 3)
+
+        recount_ratings(Publication)
+        buffer.flush()
+        buffer.flush()
+        publication.refresh_from_db()
+        self.assertEqual(publication.rating, 3)
+        self.assertEqual(buffer.pending(Publication, publication.id), 0)
@@ -3,6 +3,7 @@ import uuid
 import django_filters.rest_framework
 
 from django.contrib.contenttypes.models import ContentType
+from django.db import connection, transaction
 from django.db.models import Q
 from django.http import HttpResponse
 from rest_framework import filters, status, viewsets
@@ -10,11 +11,19 @@ from rest_framework import filters, status, viewsets
 from rest_framework.decorators import api_view
 from rest_framework.request import Request
 
+from .count import bump_count_version, track_writes
 from .models import Tag, Vote, Publication, Comment
 from .pagination import Pagination
+from .rating import RATING_BUFFER
+from .search import FullTextSearchFilter
 from .serializers import TagSerializer, VoteSerializer, PublicationSerializer, CommentSerializer
 
 
+# a delete signal receiver would turn the vote engine's single DELETE into a read followed by a write,
+# so votes bump their count version explicitly instead
+track_writes(Tag, Publication, Comment)
+
+
 class TagUidViewSet(viewsets.ModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
@@ -32,18 +41,27 @@ class VoteViewSet(viewsets.ModelViewSet):
     filter_backends = [django_filters.rest_framework.DjangoFilterBackend]
     filterset_fields = ['user_uid', 'content_type', 'object_id']
 
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        bump_count_version(Vote)
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        bump_count_version(Vote)
+
 
 class PublicationViewSet(viewsets.ModelViewSet):
     serializer_class = PublicationSerializer
     pagination_class = Pagination
-    filter_backends = [django_filters.rest_framework.DjangoFilterBackend, filters.OrderingFilter, filters.SearchFilter]
+    filter_backends = [django_filters.rest_framework.DjangoFilterBackend, filters.OrderingFilter, FullTextSearchFilter]
     filterset_fields = ['author_uid', 'tags__name']
     ordering_fields = ['pub_date', 'rating']
     ordering = ['-pub_date']
+    cursor_fields = ['-pub_date', '-id']
     search_fields = ['title', 'body']
 
     def get_queryset(self):
-        queryset = Publication.objects.all()
+        queryset = Publication.objects.prefetch_related('tags')
         authors = self.request.query_params.get('author_uid__in')
         tag_names = self.request.query_params.get('tags__name__in')
         tag_ids = self.request.query_params.get('tags__id__in')
@@ -70,6 +88,7 @@ class CommentViewSet(viewsets.ModelViewSet):
     filter_backends = [django_filters.rest_framework.DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['publication']
     ordering_fields = ['pub_date', 'rating']
+    cursor_fields = ['pub_date', 'id']
 
 
 @api_view(['GET'])
@@ -95,22 +114,52 @@ def vote(request: Request) -> HttpResponse:
     object_id = uuid.UUID(request.data['object_id'])
     vote_value = int(request.data['value'])
 
-    obj = model.objects.get(id=object_id)
-    content_type = ContentType.objects.get_for_model(obj)
     try:
-        vote_obj = Vote.objects.get(user_uid=user_uid, content_type=content_type, object_id=obj.id)
-        if vote_obj.value is not vote_value:
-            vote_obj.value = vote_value
-            vote_obj.save(update_fields=['value'])
-            obj.rating += 2 * vote_value
-            obj.save(update_fields=['rating'])
+        rating = apply_vote(model, user_uid, object_id, vote_value)
+    except model.DoesNotExist:
+        return HttpResponse(content=json.dumps({'detail': 'Not found.'}), status=status.HTTP_404_NOT_FOUND,
+                            content_type='application/json')
+
+    return HttpResponse(json.dumps({'rating': rating}), content_type='application/json')
+
+
+# One upsert records a new or flipped vote; when it changes nothing, the same vote was cast again and is taken back.
+# The upsert writes before anything is read, so concurrent votes serialize on the database instead of losing
+# updates, and the rating is moved and read back by the same UPDATE ... RETURNING.
+# In write-behind mode the rating delta is handed to the rating buffer once the vote is committed.
+# This is raw SQL because Django 4.0's ORM has neither upserts nor UPDATE ... RETURNING (an F() update would need
+# a second query to read the rating); ON CONFLICT ... RETURNING needs SQLite 3.35+ or PostgreSQL 9.5+.
+def apply_vote(model, user_uid: uuid.UUID, object_id: uuid.UUID, vote_value: int) -> int:
+    content_type = ContentType.objects.get_for_model(model)
+    uid = Vote._meta.pk
+    vote_id = uuid.uuid4()
+    key = [uid.get_db_prep_value(user_uid, connection), content_type.id, uid.get_db_prep_value(object_id, connection)]
+    votes = Vote._meta.db_table
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {votes} (user_uid, content_type_id, object_id, id, value) VALUES (%s, %s, %s, %s, %s) '
+            f'ON CONFLICT (user_uid, content_type_id, object_id) DO UPDATE SET value = excluded.value '
+            f'WHERE {votes}.value <> excluded.value RETURNING id',
+            [*key, uid.get_db_prep_value(vote_id, connection), vote_value],
+        )
+        if (row := cursor.fetchone()) is None:
+            cursor.execute(f'DELETE FROM {votes} WHERE user_uid = %s AND content_type_id = %s AND object_id = %s', key)
+            delta = -vote_value
+        elif uid.to_python(row[0]) == vote_id:
+            delta = vote_value
+        else:
+            delta = 2 * vote_value
+        if delta != 2 * vote_value:
+            transaction.on_commit(lambda: bump_count_version(Vote))
+
+        if RATING_BUFFER is not None:
+            cursor.execute(f'SELECT rating FROM {model._meta.db_table} WHERE id = %s', [key[2]])
+            transaction.on_commit(lambda: RATING_BUFFER.add(model, object_id, delta))
         else:
-            obj.rating -= vote_obj.value
-            obj.save(update_fields=['rating'])
-            vote_obj.delete()
-    except Vote.DoesNotExist:
-        obj.votes.create(user_uid=user_uid, value=vote_value, content_type=content_type, object_id=obj.id)
-        obj.rating += vote_value
-        obj.save(update_fields=['rating'])
-
-    return HttpResponse(json.dumps({'rating': obj.rating}), content_type='application/json')
+            cursor.execute(f'UPDATE {model._meta.db_table} SET rating = rating + %s WHERE id = %s RETURNING rating',
+                           [delta, key[2]])
+        if (row := cursor.fetchone()) is None:
+            raise model.DoesNotExist
+        rating = row[0]
+    return rating if RATING_BUFFER is None else rating + RATING_BUFFER.pending(model, object_id)
@@ -1,7 +1,9 @@
+import uuid
+
 import django_filters.rest_framework
 import rest_framework_simplejwt.exceptions
-from rest_framework import pagination, viewsets
-from rest_framework.decorators import api_view
+from rest_framework import pagination, status, viewsets
+from rest_framework.decorators import action, api_view
 from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import AccessToken
@@ -17,6 +19,18 @@ class UuidUserViewSet(viewsets.ModelViewSet):
     filter_backends = [django_filters.rest_framework.DjangoFilterBackend]
     filterset_fields = ['username']
 
+    @action(detail=False, methods=['post'])
+    def bulk(self, request: Request) -> Response:
+        ids = request.data.get('ids')
+        if not isinstance(ids, list):
+            return Response({'ids': ['Expected a list of uuids.']}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            uids = {uuid.UUID(str(uid)) for uid in ids}
+        except ValueError:
+            return Response({'ids': ['Must be a list of valid uuids.']}, status=status.HTTP_400_BAD_REQUEST)
+        users = UuidUser.objects.filter(id__in=uids)
+        return Response({str(user.id): UuidUserSerializer(user).data for user in users})
+
 
 @api_view(['POST'])
 def user_by_token(request: Request) -> Response:
@@ -0,0 +1,82 @@
+import hashlib
+import json
+import os
+
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.utils.functional import cached_property
+
+
+COUNT_CACHE_TTL = int(os.getenv('BLOG_COUNT_CACHE_TTL', '300'))
+COUNT_ESTIMATE = os.getenv('BLOG_COUNT_ESTIMATE', '0') == '1'
+COUNT_ESTIMATE_THRESHOLD = int(os.getenv('BLOG_COUNT_ESTIMATE_THRESHOLD', '1000'))
+COUNT_ESTIMATE_TTL = int(os.getenv('BLOG_COUNT_ESTIMATE_TTL', '60'))
+
+# query parameters that choose a page or its order, not which rows are counted
+PAGE_PARAMS = {'page', 'page_size', 'cursor', 'ordering', 'format'}
+
+
+def count_key(path: str, query_params) -> str:
+    params = sorted(
+        (key, sorted(','.join(sorted(value.split(','))) for value in query_params.getlist(key)))
+        for key in query_params if key not in PAGE_PARAMS
+    )
+    return hashlib.sha256(json.dumps([path, params]).encode()).hexdigest()
+
+
+# Write versions live in the service's database, so a write handled by one worker process invalidates
+# the counts cached by all of them; the counts themselves stay in each process's local cache.
+def count_version(model) -> int:
+    from .models import CountVersion
+
+    return CountVersion.objects.filter(label=model._meta.label_lower).values_list('version', flat=True).first() or 0
+
+
+def bump_count_version(model):
+    from .models import CountVersion
+
+    versions = CountVersion.objects.filter(label=model._meta.label_lower)
+    if not versions.update(version=F('version') + 1):
+        CountVersion.objects.bulk_create([CountVersion(label=model._meta.label_lower)], ignore_conflicts=True)
+        versions.update(version=F('version') + 1)
+
+
+# Counts are cached per model, filter and write version, so any write to the model makes them miss.
+# In estimate mode a count above the threshold is also reused across writes for COUNT_ESTIMATE_TTL seconds:
+# big listings then show a slightly stale total instead of counting their rows on every page.
+def cached_count(queryset, key: str) -> int:
+    label = queryset.model._meta.label_lower
+    exact_key = f'count:{label}:{count_version(queryset.model)}:{key}'
+    estimate_key = f'count-estimate:{label}:{key}'
+    if (count := cache.get(exact_key)) is not None:
+        return count
+    if COUNT_ESTIMATE and (count := cache.get(estimate_key)) is not None:
+        return count
+
+    count = queryset.count()
+    cache.set(exact_key, count, COUNT_CACHE_TTL)
+    if COUNT_ESTIMATE and count > COUNT_ESTIMATE_THRESHOLD:
+        cache.set(estimate_key, count, COUNT_ESTIMATE_TTL)
+    return count
+
+
+class CountCachePaginator(Paginator):
+    def __init__(self, *args, key: str, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.key = key
+
+    @cached_property
+    def count(self) -> int:
+        return cached_count(self.object_list, self.key)
+
+
+# Writes through bulk_create() or QuerySet.update()/delete() send no signals and bump the version themselves.
+def track_writes(*models):
+    for model in models:
+        post_save.connect(lambda sender, **kwargs: bump_count_version(sender), sender=model, weak=False)
+        post_delete.connect(lambda sender, **kwargs: bump_count_version(sender), sender=model, weak=False)
+        for field in model._meta.many_to_many:
+            m2m_changed.connect(lambda model=model, **kwargs: bump_count_version(model),
+                                sender=field.remote_field.through, weak=False)
@@ -10,3 +10,8 @@ class Statistics(models.Model):
     viewer_uid = models.UUIDField(blank=True, null=True)
 
     view_date = models.DateTimeField('date viewed', auto_now_add=True)
+
+
+class CountVersion(models.Model):
+    label = models.CharField(primary_key=True, max_length=100)
+    version = models.BigIntegerField(default=0)
@@ -1,14 +1,108 @@
+import base64
+import binascii
+import json
+
 from collections import OrderedDict
+from datetime import datetime
 
+from django.core.exceptions import ValidationError
+from django.db.models import Q
 from rest_framework import pagination
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from .count import CountCachePaginator, count_key
+
+
+def encode_cursor(values: list, reverse: bool) -> str:
+    values = [value.isoformat() if isinstance(value, datetime) else str(value) for value in values]
+    return base64.urlsafe_b64encode(json.dumps([values, reverse]).encode()).decode()
+
+
+# values are converted by their model fields here, so a forged cursor is a 404 and not a database error
+def decode_cursor(cursor: str, fields: list) -> tuple[list, bool]:
+    try:
+        values, reverse = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(values, list) or len(values) != len(fields) or not all(isinstance(v, str) for v in values):
+            raise ValueError(cursor)
+        values = [field.to_python(value) for field, value in zip(fields, values)]
+    except (binascii.Error, UnicodeDecodeError, ValidationError, ValueError, TypeError):
+        raise NotFound('Invalid cursor')
+    return values, bool(reverse)
+
+
+# rows strictly after `values` in the order of `fields`, e.g. ('-pub_date', '-id'):
+# pub_date < v0 OR (pub_date = v0 AND id < v1)
+def keyset_filter(fields: list[str], values: list) -> Q:
+    q = Q()
+    for i, field in enumerate(fields):
+        lookup = f'{field.lstrip("-")}__{"lt" if field.startswith("-") else "gt"}'
+        q |= Q(**{f.lstrip('-'): v for f, v in zip(fields[:i], values[:i])}, **{lookup: values[i]})
+    return q
+
+
+def reverse_ordering(fields: list[str]) -> list[str]:
+    return [field[1:] if field.startswith('-') else f'-{field}' for field in fields]
 
 
 class Pagination(pagination.PageNumberPagination):
     page_size_query_param = 'page_size'
     max_page_size = 1000
+    cursor_query_param = 'cursor'
+    count_key = None
+
+    def django_paginator_class(self, queryset, page_size):
+        return CountCachePaginator(queryset, page_size, key=self.count_key)
+
+    # Views with `cursor_fields` (an ordering that ends in a unique field) can also be paged by cursor:
+    # `?cursor=` opens the first page and every page links its neighbours by the keys of its edge items.
+    # Cursor pages skip the COUNT(*) and the OFFSET scan, so they have no items_count, num_pages or page numbers.
+    # An explicit ?ordering= cannot be followed by cursor, so such requests keep page numbers.
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_fields = getattr(view, 'cursor_fields', None)
+        if self.cursor_fields is None or self.cursor_query_param not in request.query_params \
+                or request.query_params.get(api_settings.ORDERING_PARAM):
+            self.cursor_fields = None
+            self.count_key = count_key(request.path, request.query_params)
+            return super().paginate_queryset(queryset, request, view)
+
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        fields = list(self.cursor_fields)
+        cursor = request.query_params[self.cursor_query_param]
+        model_fields = [queryset.model._meta.get_field(field.lstrip('-')) for field in fields]
+        values, reverse = decode_cursor(cursor, model_fields) if cursor else (None, False)
+        if reverse:
+            fields = reverse_ordering(fields)
+        queryset = queryset.order_by(*fields)
+        if values is not None:
+            queryset = queryset.filter(keyset_filter(fields, values))
+
+        items = list(queryset[:page_size + 1])
+        has_more = len(items) > page_size
+        items = items[:page_size]
+        if reverse:
+            items.reverse()
+
+        def key(item):
+            return [getattr(item, field.lstrip('-')) for field in self.cursor_fields]
+
+        has_next = has_more or reverse
+        has_previous = has_more if reverse else values is not None
+        self.next_cursor = encode_cursor(key(items[-1]), False) if items and has_next else None
+        self.previous_cursor = encode_cursor(key(items[0]), True) if items and has_previous else None
+        return items
 
     def get_paginated_response(self, data):
+        if self.cursor_fields is not None:
+            return Response(OrderedDict([
+                ('next_cursor', self.next_cursor),
+                ('previous_cursor', self.previous_cursor),
+                ('items', data),
+            ]))
         return Response(OrderedDict([
             ('items_count', self.page.paginator.count),
             ('num_pages', self.page.paginator.num_pages),
@@ -7,3 +7,7 @@ class StatisticsSerializer(serializers.ModelSerializer):
     class Meta:
         model = Statistics
         fields = serializers.ALL_FIELDS
+
+
+class StatisticsBulkSerializer(StatisticsSerializer):
+    id = serializers.UUIDField(required=False)
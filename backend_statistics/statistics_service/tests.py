@@ -1,3 +1,24 @@
-from django.test import TestCase
+import uuid
 
-# Create your tests here.
+from rest_framework.test import APITestCase
+
+from .models import Statistics
+
+
+class StatisticsBulkTest(APITestCase):
+    def test_redelivered_batch_creates_nothing(self):
+        batch = [{'id': str(uuid.uuid4()), 'publication_uid': str(uuid.uuid4())} for _ in range(5)]
+
+        res = self.client.post('/api/v1/statistics/bulk/', batch, format='json')
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(res.json(), {'created': 5})
+
+        res = self.client.post('/api/v1/statistics/bulk/', batch, format='json')
+        self.assertEqual(res.json(), {'created': 0})
+        self.assertEqual(Statistics.objects.count(), 5)
+
+
+class StatisticsCursorTest(APITestCase):
+    def test_malformed_cursor(self):
+        res = self.client.get('/api/v1/statistics/', {'cursor': 'W1siYSIsImIiXSwgZmFsc2Vd', 'page_size': 3})
+        self.assertEqual(res.status_code, 404)
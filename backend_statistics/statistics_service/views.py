@@ -1,10 +1,18 @@
 import django_filters.rest_framework
 
-from rest_framework import filters, viewsets
+from django.db import transaction
+from rest_framework import filters, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.request import Request
+from rest_framework.response import Response
 
+from .count import bump_count_version, track_writes
 from .models import Statistics
 from .pagination import Pagination
-from .serializers import StatisticsSerializer
+from .serializers import StatisticsSerializer, StatisticsBulkSerializer
+
+
+track_writes(Statistics)
 
 
 class StatisticsViewSet(viewsets.ModelViewSet):
@@ -14,3 +22,19 @@ class StatisticsViewSet(viewsets.ModelViewSet):
     filter_backends = [django_filters.rest_framework.DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['publication_uid']
     ordering = ['-view_date']
+    cursor_fields = ['-view_date', '-id']
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request: Request) -> Response:
+        serializer = StatisticsBulkSerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        # events carry their own ids, so a redelivered batch does not duplicate views;
+        # bulk_create() returns every object it was given, so the inserted ones are counted by id
+        stats = [Statistics(**item) for item in serializer.validated_data]
+        ids = [stat.id for stat in stats]
+        with transaction.atomic():
+            existing = Statistics.objects.filter(id__in=ids).count()
+            Statistics.objects.bulk_create(stats, ignore_conflicts=True)
+            created = Statistics.objects.filter(id__in=ids).count() - existing
+        bump_count_version(Statistics)
+        return Response({'created': created}, status=status.HTTP_201_CREATED)
@@ -0,0 +1,23 @@
+import time
+
+from django.http import HttpResponse
+from rest_framework import status
+
+
+DEADLINE_HEADER = 'X-Request-Deadline'
+
+
+# The gateway sends the absolute time after which nobody waits for the answer any more,
+# so a request that expired while queued is dropped before any work is done for it.
+class DeadlineMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            deadline = float(request.headers.get(DEADLINE_HEADER, 'inf'))
+        except ValueError:
+            deadline = float('inf')
+        if deadline <= time.time():
+            return HttpResponse(content=b'Request deadline exceeded', status=status.HTTP_504_GATEWAY_TIMEOUT)
+        return self.get_response(request)
@@ -0,0 +1,20 @@
+# Generated by Django 4.0.6 on 2026-10-18 12:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscription_service', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CountVersion',
+            fields=[
+                ('label', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
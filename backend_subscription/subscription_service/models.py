@@ -16,3 +16,8 @@ class Subscription(models.Model):
     following_uid = models.UUIDField(editable=False)
 
     sub_date = models.DateTimeField('date subscribed', auto_now_add=True)
+
+
+class CountVersion(models.Model):
+    label = models.CharField(primary_key=True, max_length=100)
+    version = models.BigIntegerField(default=0)
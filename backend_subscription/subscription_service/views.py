@@ -2,11 +2,15 @@ import django_filters.rest_framework
 
 from rest_framework import filters, viewsets
 
+from .count import track_writes
 from .models import Subscription
 from .pagination import Pagination
 from .serializers import SubscriptionSerializer
 
 
+track_writes(Subscription)
+
+
 class SubscriptionViewSet(viewsets.ModelViewSet):
     queryset = Subscription.objects.all()
     serializer_class = SubscriptionSerializer
@@ -14,3 +18,4 @@ class SubscriptionViewSet(viewsets.ModelViewSet):
     filter_backends = [django_filters.rest_framework.DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['follower_uid', 'following_uid']
     ordering = ['-sub_date']
+    cursor_fields = ['-sub_date', '-subscription_uid']
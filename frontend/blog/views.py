@@ -12,6 +12,9 @@ from rest_framework import status
 from .forms import LoginForm, RegisterForm, PublicationForm, CommentForm, EmptyForm
 
 
+CURSOR_PAGINATION = os.getenv('BLOG_CURSOR_PAGINATION', '0') == '1'
+
+
 class ServiceUrl:
     GATEWAY = os.getenv('BLOG_BACKEND_GATEWAY_URL', 'http://localhost:8081')
     SESSION = os.getenv('BLOG_BACKEND_SESSION_URL', 'http://localhost:8082')
@@ -32,8 +35,9 @@ def log_request(prompt: str, res: requests.Response) -> (requests.Response, str
     return res, _json
 
 
-def log_request_get(prompt: str, url: str, params: dict | None = None) -> (requests.Response, str | dict | list):
-    res = requests.get(url, params)
+def log_request_get(prompt: str, url: str, params: dict | None = None,
+                    headers: dict | None = None) -> (requests.Response, str | dict | list):
+    res = requests.get(url, params, headers=headers)
     print(f'DEBUG-{prompt}-REQUEST-PARAMS', params)
     return log_request(prompt, res)
 
@@ -90,6 +94,11 @@ def get_auth_user(request: HttpRequest) -> dict:
     return {'is_authenticated': True, **_json}
 
 
+def auth_headers(request: HttpRequest) -> dict:
+    access_token = request.COOKIES.get('access_token')
+    return {} if access_token is None else {'Authorization': f'Bearer {access_token}'}
+
+
 class ContextPassUserMixin:
     cached_context = None
 
@@ -321,12 +330,15 @@ class CommentDeleteView(CommentManipulateMixin, FormView):
 def set_page_params(params):
     params['page'] = params.get('page', 1)
     params['page_size'] = params.get('page_size', 10)
+    if CURSOR_PAGINATION:
+        params['cursor'] = params.get('cursor', '')
 
 
-def paginated_request_get(prompt: str, request: HttpRequest, url: str) -> (requests.Response, dict | list | str):
+def paginated_request_get(prompt: str, request: HttpRequest, url: str,
+                          headers: dict | None = None) -> (requests.Response, dict | list | str):
     params = request.GET.copy()
     set_page_params(params)
-    return log_request_get(prompt, url, params)
+    return log_request_get(prompt, url, params, headers)
 
 
 def publications_view(request: HttpRequest) -> HttpResponse:
@@ -378,31 +390,29 @@ def get_tag_by_name(name: str):
 
 
 def blog_view(request: HttpRequest, username: str) -> HttpResponse:
-    user = get_user_by_username(username)
-    if user is None:
-        return HttpResponseNotFound(f'User with username "{username}" not found')
-
-    auth_user = get_auth_user(request)
-
-    subscribed = None
-    if auth_user['is_authenticated'] and auth_user['username'] != username:
-        subscribed = check_subscribed(auth_user['id'], user['id'])
-
     res, _json = paginated_request_get(
-        'GET-USER-PUBLICATIONS',
+        'GET-USER-PAGE',
         request,
-        f'{ServiceUrl.GATEWAY}/api/v1/publications/?author_uid={user["id"]}'
+        f'{ServiceUrl.GATEWAY}/api/v1/pages/user/{username}/',
+        auth_headers(request)
     )
     if res.status_code != status.HTTP_200_OK:
-        return error(request, auth_user, 'Publication service is unavailable')
+        # the gateway marks a missing user with "user": null; other 404s are about the requested page
+        if res.status_code == status.HTTP_404_NOT_FOUND and isinstance(_json, dict) and 'user' in _json:
+            return HttpResponseNotFound(f'User with username "{username}" not found')
+        if res.status_code >= status.HTTP_500_INTERNAL_SERVER_ERROR:
+            return error(request, get_auth_user(request), 'Publication or session service is unavailable')
+        return error(request, get_auth_user(request), f'{res.status_code}: {_json}')
+
+    user = _json['user']
     return render(request, 'blog/publication-list.html', {
-        'user': auth_user,
+        'user': _json['auth_user'],
         'author_uid': user['id'],
         'username': user['username'],
         'first_name': user['first_name'],
         'last_name': user['last_name'],
-        'response': _json,
-        'subscribed': subscribed,
+        'response': _json['publications'],
+        'subscribed': _json['subscribed'],
     })
 
 
@@ -464,36 +474,26 @@ class VoteView(View):
 
 
 def tag_view(request: HttpRequest, tag: str) -> HttpResponse:
-    auth_user = get_auth_user(request)
-
-    subscribed = None
-    if auth_user['is_authenticated']:
-        res, _json = log_request_get('GET-TAG', f'{ServiceUrl.GATEWAY}/api/v1/tags/{tag}/')
-        if res.status_code != status.HTTP_200_OK:
-            if res.status_code == status.HTTP_404_NOT_FOUND:
-                return error(request, auth_user, f'Tag {tag} not found')
-            if res.status_code >= status.HTTP_500_INTERNAL_SERVER_ERROR:
-                return error(request, auth_user, f'Publication service is unavailable')
-            print(res)
-            raise Exception(_json)
-        tag_uid = _json['id']
-        subscribed = check_subscribed(auth_user['id'], tag_uid)
-
     res, _json = paginated_request_get(
-        'GET-PUBLICATIONS-BY-TAG',
+        'GET-TAG-PAGE',
         request,
-        f'{ServiceUrl.GATEWAY}/api/v1/publications/?tags__name={tag}'
+        f'{ServiceUrl.GATEWAY}/api/v1/pages/tag/{tag}/',
+        auth_headers(request)
     )
     if res.status_code != status.HTTP_200_OK:
         if res.status_code >= status.HTTP_500_INTERNAL_SERVER_ERROR:
-            return error(request, auth_user, f'Publication service is unavailable')
+            return error(request, get_auth_user(request), f'Publication service is unavailable')
         print(res)
         raise Exception(_json)
+
+    auth_user = _json['auth_user']
+    if auth_user['is_authenticated'] and _json['tag'] is None:
+        return error(request, auth_user, f'Tag {tag} not found')
     return render(request, 'blog/publication-list.html', {
         'user': auth_user,
         'tag': tag,
-        'response': _json,
-        'subscribed': subscribed,
+        'response': _json['publications'],
+        'subscribed': _json['subscribed'],
     })
 
 